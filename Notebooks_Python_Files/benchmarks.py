@@ -0,0 +1,375 @@
+"""
+    Micro-benchmarks comparing the original row-by-row functions against their faster counterparts.
+    Everything runs offline on synthetic Trip Advisor like reviews.
+
+    To run a benchmark, cd into this directory & enter: python benchmarks.py <benchmark_name>
+    The end-to-end benchmark of the whole pipeline, with baseline comparison, is in pipeline_benchmark.py.
+"""
+
+import argparse
+import os
+import random
+import subprocess
+import sys
+import time
+import tracemalloc
+
+import pandas as pd
+
+SYNTHETIC_WORDS = ['the', 'valley', 'was', 'beautiful', 'and', 'we', 'hiked', 'to', 'top', 'of', 'falls',
+                   'trail', 'is', 'easy', 'with', 'kids', 'views', 'amazing', 'waterfall', 'half', 'dome',
+                   'crowded', 'parking', 'morning', 'sunset', 'glacier', 'point', 'must', 'visit', 'bears',
+                   'can', 'wait', 'go', 'back', 'again', 'it', 'very', 'steep', 'but', 'worth']
+SYNTHETIC_EXTRAS = ['!', '...', ',', 'http://bit.ly/yose', 'me@mail.com', '2020', '(great)', "don't", '-', ':)']
+# Words that send a text down NLTK's tokenizer in remove_stopwords_texts, kept rare (about 3% of the reviews) as in real reviews
+SYNTHETIC_RARE_WORDS = ['cannot', 'gonna', 'wanna']
+RARE_WORD_RATE = 0.0005
+
+def synthetic_reviews(n_reviews = 100000, words_per_review = 60, seed = 0):
+    """
+    Generates random reviews made of park related words, sprinkled with punctuation, urls, emails & numbers.
+
+    Args:
+        n_reviews (int, optional): Number of reviews to be generated. Defaults to 100000.
+        words_per_review (int, optional): Average number of words in each review. Defaults to 60.
+        seed (int, optional): Random seed, so that the same reviews are generated across runs. Defaults to 0.
+
+    Returns:
+        [pd.Series]: Synthetic reviews
+    """
+
+    rng = random.Random(seed)
+    reviews = []
+    for _ in range(n_reviews):
+        n_words = rng.randint(words_per_review // 2, words_per_review * 3 // 2)
+        words = [synthetic_word(rng) for _ in range(n_words)]
+        words[0] = words[0].capitalize()
+        reviews.append(' '.join(words))
+
+    return pd.Series(reviews, name = 'review_text')
+
+def synthetic_word(rng):
+    """
+    Random review word: a rare word, an extra (punctuation, url, email, number...) 5% of the time or a park related word.
+    """
+
+    draw = rng.random()
+    if draw < RARE_WORD_RATE:
+        return rng.choice(SYNTHETIC_RARE_WORDS)
+    if draw < 0.05:
+        return rng.choice(SYNTHETIC_EXTRAS)
+    return rng.choice(SYNTHETIC_WORDS)
+
+SYNTHETIC_MONTHS = ['Jan', 'Feb', 'Mar', 'Apr', 'May', 'Jun', 'Jul', 'Aug', 'Sep', 'Oct', 'Nov', 'Dec']
+
+REVIEW_BLOCK_HTML = """
+<div class="Dq9MAugU T870kzTX LnVzGwUB">
+  <div class="_2fxQ4TOx"><span><a class="_1r_My98y" href="/Profile/{user}">{user}</a> wrote a review {month} {year}</span></div>
+  <div><span class="_1fk70GUn">{votes}</span> helpful votes</div>
+  <div><span class="ui_bubble_rating bubble_{rating}0"></span></div>
+  <div class="glasR4aX"><a class="ocfR3SKN" href="{link}"><span>{title}</span></a></div>
+  <div><q class="IRsGHoPm"><span>{short_text}</span></q></div>
+  <span class="_34Xs-BQm"><span>Date of experience:</span> {month} {year}</span>
+</div>"""
+
+PAGE_HTML = """<!DOCTYPE html><html><head><title>{title}</title>
+<script>{script}</script><style>{style}</style></head>
+<body><div id="header">{navigation}</div><div id="content">{content}</div><div id="footer">{navigation}</div></body></html>"""
+
+def synthetic_listing_page(n_reviews = 5, page_id = 0, seed = 0):
+    """
+    Generates the html of an attraction reviews page, with the same structure & class names that
+    ta_attraction_reviews_parser expects, and the review links (url -> full review html) it points to.
+
+    Returns:
+        Returns a tuple containing 2 elements
+        page_html [str]: html of the reviews page
+        review_pages [dict]: Review page html keyed by review link
+    """
+
+    rng = random.Random(seed * 100003 + page_id)
+    reviews = synthetic_reviews(n_reviews, seed = seed * 100003 + page_id).tolist()
+
+    blocks = []
+    review_pages = {}
+    for i, review_text in enumerate(reviews):
+        link = f'/ShowUserReviews-g61000-d139187-r{page_id * n_reviews + i}-Glacier_Point.html'
+        blocks.append(REVIEW_BLOCK_HTML.format(user = f'traveller{rng.randint(0, 10 ** 6)}', month = rng.choice(SYNTHETIC_MONTHS),
+                                               year = rng.randint(2010, 2020), votes = rng.randint(1, 50),
+                                               rating = rng.randint(1, 5), link = link, title = review_text[:30],
+                                               short_text = review_text[:100]))
+        review_pages[link] = synthetic_page(f'<span class="fullText">{review_text}</span>', rng)
+
+    return synthetic_page(''.join(blocks), rng), review_pages
+
+def synthetic_page(content, rng):
+    """
+    Wraps the content in a page padded with scripts, styles & navigation links, like a real Trip Advisor page.
+    """
+
+    navigation = ''.join(f'<li><a href="/Attraction{rng.randint(0, 10 ** 6)}">Link {i}</a></li>' for i in range(300))
+    return PAGE_HTML.format(title = 'Glacier Point - Yosemite National Park', script = 'var x = 1;' * 2000,
+                            style = '.a{color:red}' * 1000, navigation = f'<ul>{navigation}</ul>', content = content)
+
+class FixtureFetcher:
+    """
+    Stand-in for ReviewFetcher serving stored review pages from a dictionary instead of the network.
+    """
+
+    def __init__(self, review_pages):
+        self.review_pages = review_pages
+
+    def fetch(self, page_url):
+        return self.review_pages.get(page_url)
+
+    def fetch_many(self, page_urls, parse = None):
+        pages = [self.fetch(page_url) for page_url in page_urls]
+        return [parse(page) if (parse and page) else page for page in pages]
+
+def time_function(function, *args, **kwargs):
+    """
+    Runs the function once & returns a tuple of its output and the elapsed wall time in seconds.
+    """
+
+    start = time.perf_counter()
+    output = function(*args, **kwargs)
+    return output, time.perf_counter() - start
+
+def benchmark_cleaning(n_reviews = 100000):
+    """
+    Compares cleaning() & remove_stopwords() mapped over a Series against clean_texts() & remove_stopwords_texts().
+    """
+
+    import nlp_preprocessing
+    from nltk.corpus import stopwords
+
+    reviews = synthetic_reviews(n_reviews)
+    stop_words = stopwords.words('english')
+
+    row_clean, row_clean_time = time_function(reviews.map, nlp_preprocessing.cleaning)
+    corpus_clean, corpus_clean_time = time_function(nlp_preprocessing.clean_texts, reviews)
+    assert row_clean.equals(corpus_clean), 'clean_texts output differs from cleaning'
+
+    row_stop, row_stop_time = time_function(row_clean.map, lambda x: nlp_preprocessing.remove_stopwords(x, stop_words))
+    corpus_stop, corpus_stop_time = time_function(nlp_preprocessing.remove_stopwords_texts, corpus_clean, stop_words)
+    assert row_stop.equals(corpus_stop), 'remove_stopwords_texts output differs from remove_stopwords'
+
+    return pd.DataFrame({'row_by_row_sec': [row_clean_time, row_stop_time],
+                         'corpus_sec': [corpus_clean_time, corpus_stop_time]},
+                        index = ['cleaning', 'remove_stopwords']).assign(
+                            speed_up = lambda x: x.row_by_row_sec / x.corpus_sec)
+
+def benchmark_import(n_runs = 5):
+    """
+    Measures the time & peak memory of importing nlp_preprocessing in a fresh interpreter,
+    against importing it and loading the spacy model (which is what every import used to cost).
+    """
+
+    statements = {'import nlp_preprocessing': 'import nlp_preprocessing',
+                  'import + clean_texts': 'import nlp_preprocessing; nlp_preprocessing.clean_texts(["Great views!"])',
+                  'import + spacy model load': 'import nlp_preprocessing; nlp_preprocessing.get_spacy_model()'}
+
+    rows = []
+    for label, statement in statements.items():
+        timings = []
+        peak_rss = []
+        for _ in range(n_runs):
+            code = ('import resource, time; start = time.perf_counter(); ' + statement +
+                    '; print(time.perf_counter() - start, resource.getrusage(resource.RUSAGE_SELF).ru_maxrss)')
+            output = subprocess.run([sys.executable, '-c', code], capture_output = True, text = True, check = True)
+            seconds, max_rss = output.stdout.split()[-2:]
+            timings.append(float(seconds))
+            peak_rss.append(int(max_rss) / 1024)
+        rows.append({'statement': label, 'median_sec': pd.Series(timings).median(),
+                     'peak_rss_mb': pd.Series(peak_rss).median()})
+
+    return pd.DataFrame(rows).set_index('statement')
+
+def benchmark_html_parsing(n_pages = 100, fixtures_dir = None):
+    """
+    Parses attraction reviews pages (5 reviews each) with every BeautifulSoup backend, with & without SoupStrainer,
+    and reports the parse time & peak memory per listing page (including its 5 review pages).
+    The extracted fields must be identical for every backend.
+
+    Args:
+        n_pages (int, optional): Number of synthetic listing pages. Defaults to 100.
+        fixtures_dir (str, optional): Folder of stored html pages, named 'listing_*.html' for reviews pages and
+                                      after the review link (without the leading '/') for review pages. Defaults to synthetic pages.
+    """
+
+    import scraping
+    from bs4 import BeautifulSoup
+
+    if fixtures_dir:
+        listing_pages = []
+        review_pages = {}
+        for file_name in sorted(os.listdir(fixtures_dir)):
+            with open(os.path.join(fixtures_dir, file_name), encoding = 'utf-8') as html_file:
+                if file_name.startswith('listing_'):
+                    listing_pages.append(html_file.read())
+                else:
+                    review_pages['/' + file_name] = html_file.read()
+    else:
+        listing_pages = []
+        review_pages = {}
+        for page_id in range(n_pages):
+            page_html, pages = synthetic_listing_page(page_id = page_id)
+            listing_pages.append(page_html)
+            review_pages.update(pages)
+
+    fetcher = FixtureFetcher(review_pages)
+
+    def full_tree_soup(page_html, parser):
+        return BeautifulSoup(page_html, parser)
+
+    rows = []
+    reference = None
+    for parser in ['html5lib', 'html.parser', 'lxml']:
+        for strained in [False, True]:
+            if strained and parser == 'html5lib':
+                continue
+            make_soup = scraping.ta_listing_page_soup if strained else full_tree_soup
+
+            def parse_pages():
+                return [scraping.ta_attraction_reviews_parser(make_soup(page_html, parser), fetcher, parser = parser)
+                        for page_html in listing_pages]
+
+            # Strainers are also used for the review pages, so they are switched off for the full tree runs
+            strainer = scraping.REVIEW_TEXT_STRAINER
+            scraping.REVIEW_TEXT_STRAINER = strainer if strained else None
+            try:
+                extracted, seconds = time_function(parse_pages)
+                tracemalloc.start()
+                parse_pages()
+                peak_memory = tracemalloc.get_traced_memory()[1]
+                tracemalloc.stop()
+            finally:
+                scraping.REVIEW_TEXT_STRAINER = strainer
+
+            if reference is None:
+                reference = extracted
+            identical = (extracted == reference)
+            rows.append({'parser': parser, 'soup_strainer': strained, 'ms_per_page': 1000 * seconds / len(listing_pages),
+                         'peak_memory_mb': peak_memory / 2 ** 20, 'identical_fields': identical})
+
+    return pd.DataFrame(rows).set_index(['parser', 'soup_strainer'])
+
+def benchmark_recommender(n_queries = None):
+    """
+    Compares yosemite_attraction_reco against AttractionRecommender on every combination of 3 priorities
+    (as selected in the streamlit app), checking the recommendations are identical, and reports the latency per query.
+    """
+
+    from collections import defaultdict
+    from itertools import product
+    import recommender_and_other_functions as rof
+
+    df = pd.read_csv('../Data/Attractions_Topics_Summary_Scores.csv', index_col = 0)
+    options = df.columns.tolist()[0:12]
+
+    users_weights = []
+    for priorities in product(options, repeat = 3):
+        user_weights = defaultdict(int)
+        for priority in priorities:
+            user_weights[priority] = 1
+        users_weights.append(user_weights)
+    if n_queries:
+        users_weights = (users_weights * (n_queries // len(users_weights) + 1))[:n_queries]
+
+    function_results, function_time = time_function(
+        lambda: [rof.yosemite_attraction_reco(df, user_weights) for user_weights in users_weights])
+    recommender, build_time = time_function(rof.AttractionRecommender, df)
+    single_results, single_time = time_function(
+        lambda: [recommender.recommend(user_weights) for user_weights in users_weights])
+    batch_results, batch_time = time_function(recommender.recommend_batch, users_weights)
+
+    assert function_results == single_results == batch_results, 'AttractionRecommender results differ from yosemite_attraction_reco'
+
+    n = len(users_weights)
+    return pd.DataFrame({'us_per_query': [1e6 * function_time / n, 1e6 * single_time / n, 1e6 * batch_time / n],
+                         'total_sec': [function_time, single_time + build_time, batch_time + build_time]},
+                        index = ['yosemite_attraction_reco', 'AttractionRecommender.recommend',
+                                 'AttractionRecommender.recommend_batch'])
+
+def benchmark_retrieval(n_attractions = None, n_queries = 100, k = 10):
+    """
+    Reports build time, latency per query & recall@k of the AttractionRecommender backends (brute force, BallTree & IVF)
+    on synthetic catalogs of 10, 10k & 1M attractions with 18 topics. Recall is measured against an exact float64 brute force.
+
+    Args:
+        n_attractions (int, optional): Single catalog size to be run instead of the default 3 sizes.
+        n_queries (int, optional): Number of users, each with 3 random priorities. Defaults to 100.
+        k (int, optional): Number of recommendations per query. Defaults to 10.
+    """
+
+    import numpy as np
+    import recommender_and_other_functions as rof
+
+    rng = np.random.RandomState(0)
+    n_topics = 18
+    topics = [f'topic_{i}' for i in range(n_topics)]
+    users_weights = [{topic: 1 for topic in rng.choice(topics, 3, replace = False)} for _ in range(n_queries)]
+
+    rows = []
+    for n in ([n_attractions] if n_attractions else [10, 10000, 1000000]):
+        df = pd.DataFrame(rng.gamma(0.5, 0.2, size = (n, n_topics)), columns = topics,
+                          index = [f'attraction_{i}' for i in range(n)])
+        exact = rof.AttractionRecommender(df, dtype = np.float64).recommend_batch(users_weights, k)
+
+        for index in [None, 'balltree', 'ivf']:
+            recommender, build_time = time_function(rof.AttractionRecommender, df, index = index)
+            results, query_time = time_function(
+                lambda: [recommender.recommend(user_weights, k) for user_weights in users_weights])
+            recall = np.mean([len(set(result) & set(truth)) / len(truth) for result, truth in zip(results, exact)])
+            rows.append({'n_attractions': n, 'index': index or 'brute force', 'build_sec': build_time,
+                         'ms_per_query': 1000 * query_time / n_queries, f'recall@{k}': recall})
+
+    return pd.DataFrame(rows).set_index(['n_attractions', 'index'])
+
+def benchmark_top_words(n_words = 50000, n_reviews = 100000, n_topics = 18, n_top = 10):
+    """
+    Compares calling top_words & top_reviews once per topic (as the interpretation notebook does)
+    against the batch top_words_and_reviews, on random topic scores at a realistic vocabulary & corpus size.
+    """
+
+    import numpy as np
+    import topic_modeling as tm
+
+    rng = np.random.RandomState(0)
+    topic_columns = [f'topic_{topic}' for topic in range(n_topics)]
+    word_topic_df = pd.DataFrame(rng.gamma(0.3, 1, size = (n_words, n_topics)), columns = topic_columns,
+                                 index = [f'word_{i}' for i in range(n_words)])
+    topic_matrix_df = pd.DataFrame(rng.dirichlet(np.ones(n_topics) * 0.3, size = n_reviews), columns = topic_columns)
+    topic_matrix_df['raw_review'] = [f'review {i}' for i in range(n_reviews)]
+
+    def per_topic():
+        words = {topic: tm.top_words(word_topic_df, topic, n_top) for topic in range(n_topics)}
+        reviews = {topic: tm.top_reviews(topic_matrix_df, topic, n_top) for topic in range(n_topics)}
+        return words, reviews
+
+    (words, reviews), per_topic_time = time_function(per_topic)
+    (batch_words, batch_reviews), batch_time = time_function(tm.top_words_and_reviews, word_topic_df, topic_matrix_df,
+                                                             n_top, n_top)
+
+    assert all(words[topic].equals(batch_words[topic]) for topic in range(n_topics)), 'top words differ'
+    assert all((reviews[topic] == batch_reviews[topic]).all() for topic in range(n_topics)), 'top reviews differ'
+
+    return pd.DataFrame({'total_sec': [per_topic_time, batch_time]},
+                        index = ['top_words & top_reviews per topic', 'top_words_and_reviews']).assign(
+                            speed_up = lambda x: per_topic_time / x.total_sec)
+
+BENCHMARKS = {'cleaning': benchmark_cleaning,
+              'import': benchmark_import,
+              'html_parsing': benchmark_html_parsing,
+              'recommender': benchmark_recommender,
+              'retrieval': benchmark_retrieval,
+              'top_words': benchmark_top_words}
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description = 'Run a benchmark on synthetic reviews')
+    parser.add_argument('benchmark', choices = sorted(BENCHMARKS))
+    parser.add_argument('--n', type = int, default = None, help = 'Size of the synthetic data')
+    arguments = parser.parse_args()
+
+    args = [] if arguments.n is None else [arguments.n]
+    print(BENCHMARKS[arguments.benchmark](*args))
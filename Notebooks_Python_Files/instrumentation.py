@@ -0,0 +1,275 @@
+"""
+    Opt-in instrumentation of the pipeline modules, to find out which stage a slow run spends its time in.
+
+    While enabled, the public functions (lru_cache ones included) and the public methods of the public classes of
+    nlp_preprocessing, topic_modeling, scraping & recommender_and_other_functions are wrapped to record their number
+    of calls, cumulative & percentile latency and the number of documents & bytes (characters for texts) they were given.
+    Optionally, every function is also profiled with cProfile & dumped as a .prof file (readable with pstats or snakeviz).
+    Disabling restores the original functions, so there is no overhead at all when instrumentation is off.
+
+    The functions are replaced on their module, so calls have to go through the module (e.g. import nlp_preprocessing
+    & nlp_preprocessing.clean_texts(...), as done in the notebooks) to be recorded:
+
+        import instrumentation
+        with instrumentation.instrumented(profile_dir = 'profiles') as recorder:
+            cleaned = nlp_preprocessing.clean_texts(df.review_text)
+        print(recorder.summary())
+"""
+
+import cProfile
+import functools
+import importlib
+import inspect
+import os
+import threading
+import time
+from array import array
+from contextlib import contextmanager
+
+import numpy as np
+import pandas as pd
+
+DEFAULT_MODULES = ['nlp_preprocessing', 'topic_modeling', 'scraping', 'recommender_and_other_functions']
+
+# Functions taking one of these as their first argument fetch their documents themselves (e.g. the scraping entry
+# points), so no input size is recorded for them rather than counting the url as a document
+URL_PARAMETERS = {'url_template', 'review_url'}
+
+class StageRecorder:
+    """
+    Thread safe store of the calls recorded for every instrumented function (a stage), keyed by 'module.qualname'.
+
+    Args:
+        profile_dir (str, optional): Folder where a cProfile dump of every stage is written on disable. Defaults to None (no profiling).
+    """
+
+    def __init__(self, profile_dir = None):
+        self.profile_dir = profile_dir
+        self.lock = threading.Lock()
+        self.latencies = {}
+        self.documents = {}
+        self.bytes = {}
+        self.profiles = {}
+        # Only the outermost instrumented call of a thread is profiled, as cProfile profilers can't be nested
+        self.local = threading.local()
+
+    def record(self, stage, seconds, n_documents, n_bytes):
+        with self.lock:
+            self.latencies.setdefault(stage, array('d')).append(seconds)
+            self.documents[stage] = self.documents.get(stage, 0) + (n_documents or 0)
+            self.bytes[stage] = self.bytes.get(stage, 0) + (n_bytes or 0)
+
+    def call(self, stage, function, args, kwargs, measure_input = True):
+        """
+        Calls the function, recording its latency & input size (and profiling it if it is the outermost call).
+        """
+
+        n_documents, n_bytes = _input_size(args) if measure_input else (None, None)
+        profile = None
+        if self.profile_dir and not getattr(self.local, 'profiling', False):
+            with self.lock:
+                profile = self.profiles.setdefault(stage, cProfile.Profile())
+            self.local.profiling = True
+            profile.enable()
+
+        start = time.perf_counter()
+        try:
+            return function(*args, **kwargs)
+        finally:
+            seconds = time.perf_counter() - start
+            if profile is not None:
+                profile.disable()
+                self.local.profiling = False
+            self.record(stage, seconds, n_documents, n_bytes)
+
+    def summary(self):
+        """
+        Returns a dataframe with one row per stage: calls, total & percentile latency, documents, bytes & documents per second.
+        Total time is cumulative, i.e. it includes the time spent in the instrumented functions a stage calls.
+        """
+
+        rows = []
+        with self.lock:
+            for stage, latencies in self.latencies.items():
+                latencies_ms = 1000 * np.frombuffer(latencies, dtype = np.float64)
+                total_sec = latencies_ms.sum() / 1000
+                rows.append({'stage': stage, 'calls': len(latencies_ms), 'total_sec': total_sec,
+                             'mean_ms': latencies_ms.mean(), 'p50_ms': np.percentile(latencies_ms, 50),
+                             'p95_ms': np.percentile(latencies_ms, 95), 'p99_ms': np.percentile(latencies_ms, 99),
+                             'max_ms': latencies_ms.max(), 'documents': self.documents[stage], 'bytes': self.bytes[stage],
+                             'documents_per_sec': self.documents[stage] / total_sec if total_sec else None})
+
+        columns = ['calls', 'total_sec', 'mean_ms', 'p50_ms', 'p95_ms', 'p99_ms', 'max_ms', 'documents', 'bytes', 'documents_per_sec']
+        if not rows:
+            return pd.DataFrame(columns = columns)
+        return pd.DataFrame(rows).set_index('stage')[columns].sort_values('total_sec', ascending = False)
+
+    def to_json(self, path = None):
+        """
+        Returns the summary as a JSON string, also writing it to path if provided.
+        """
+
+        content = self.summary().reset_index().to_json(orient = 'records', indent = 2)
+        if path:
+            with open(path, 'w') as json_file:
+                json_file.write(content)
+        return content
+
+    def dump_profiles(self):
+        """
+        Writes the cProfile stats of every profiled stage to profile_dir/<stage>.prof & returns their paths.
+        """
+
+        if not self.profile_dir:
+            return []
+        os.makedirs(self.profile_dir, exist_ok = True)
+        paths = []
+        with self.lock:
+            for stage, profile in self.profiles.items():
+                path = os.path.join(self.profile_dir, f'{stage}.prof')
+                profile.dump_stats(path)
+                paths.append(path)
+        return paths
+
+_active = {'recorder': None, 'originals': []}
+
+def enable(modules = DEFAULT_MODULES, profile_dir = None):
+    """
+    Instruments the public functions & methods of the modules, and returns the StageRecorder collecting the calls.
+
+    Args:
+        modules (list, optional): Modules (or module names) to be instrumented. Defaults to the 4 pipeline modules.
+        profile_dir (str, optional): Folder for the per stage cProfile dumps, written by disable(). Defaults to None (no profiling).
+    """
+
+    if _active['recorder'] is not None:
+        raise RuntimeError('Instrumentation is already enabled')
+
+    recorder = StageRecorder(profile_dir)
+    for module in modules:
+        module = importlib.import_module(module) if isinstance(module, str) else module
+        for name, member in list(vars(module).items()):
+            if name.startswith('_') or getattr(member, '__module__', None) != module.__name__:
+                continue
+            if inspect.isfunction(member):
+                _replace(module, name, member, _wrap(recorder, member))
+            elif isinstance(member, functools._lru_cache_wrapper):
+                # Cached functions (e.g. get_spacy_model) are recorded on every call, cache hits included
+                _replace(module, name, member, _wrap_cached(recorder, member))
+            elif inspect.isclass(member):
+                for method_name, method in list(vars(member).items()):
+                    if method_name.startswith('_'):
+                        continue
+                    if inspect.isfunction(method):
+                        _replace(member, method_name, method, _wrap(recorder, method))
+                    elif isinstance(method, classmethod):
+                        _replace(member, method_name, method, classmethod(_wrap(recorder, method.__func__)))
+
+    _active['recorder'] = recorder
+    return recorder
+
+def disable():
+    """
+    Restores the original functions & writes the cProfile dumps, if any. Returns the StageRecorder of the run.
+    """
+
+    recorder = _active['recorder']
+    for owner, name, original in reversed(_active['originals']):
+        setattr(owner, name, original)
+    _active['recorder'] = None
+    _active['originals'] = []
+
+    if recorder is not None:
+        recorder.dump_profiles()
+    return recorder
+
+@contextmanager
+def instrumented(modules = DEFAULT_MODULES, profile_dir = None):
+    """
+    Context manager version of enable/disable, yielding the StageRecorder.
+    """
+
+    recorder = enable(modules, profile_dir)
+    try:
+        yield recorder
+    finally:
+        disable()
+
+def _replace(owner, name, original, replacement):
+    _active['originals'].append((owner, name, original))
+    setattr(owner, name, replacement)
+
+def _wrap(recorder, function):
+    stage = f'{function.__module__}.{function.__qualname__}'
+    parameters = [name for name in inspect.signature(function).parameters if name not in ('self', 'cls')]
+    measure_input = not (parameters and parameters[0] in URL_PARAMETERS)
+
+    if inspect.isgeneratorfunction(function):
+        # Generators (e.g. ta_attraction_pages) are timed until exhausted or closed, including the time
+        # the caller spends between items, and are not profiled
+        @functools.wraps(function)
+        def generator_wrapper(*args, **kwargs):
+            n_documents, n_bytes = _input_size(args) if measure_input else (None, None)
+            start = time.perf_counter()
+            try:
+                yield from function(*args, **kwargs)
+            finally:
+                recorder.record(stage, time.perf_counter() - start, n_documents, n_bytes)
+
+        return generator_wrapper
+
+    @functools.wraps(function)
+    def wrapper(*args, **kwargs):
+        return recorder.call(stage, function, args, kwargs, measure_input)
+
+    return wrapper
+
+def _wrap_cached(recorder, cached_function):
+    """
+    Wraps an lru_cache function, keeping its cache_info & cache_clear available to the callers.
+    """
+
+    wrapper = _wrap(recorder, cached_function)
+    wrapper.cache_info = cached_function.cache_info
+    wrapper.cache_clear = cached_function.cache_clear
+    return wrapper
+
+def _input_size(args):
+    """
+    Number of documents & bytes of the first argument that is a text, a collection of texts or an array
+    (methods' self is skipped). Returns (None, None) when the size can't be inferred cheaply.
+    """
+
+    for value in args[:2]:
+        if isinstance(value, str):
+            return 1, len(value)
+        if isinstance(value, (list, tuple, pd.Series)):
+            if len(value) and isinstance(next(iter(value)), str):
+                return len(value), sum(len(text) for text in value)
+            return len(value), None
+        if isinstance(value, pd.DataFrame):
+            return len(value), int(value.memory_usage(index = False).sum())
+        if hasattr(value, 'shape') and hasattr(value, 'nbytes'):
+            return (value.shape[0] if value.shape else 1), value.nbytes
+        if hasattr(value, 'shape') and hasattr(value, 'data') and hasattr(value.data, 'nbytes'):
+            # Scipy sparse matrices
+            return value.shape[0], value.data.nbytes
+    return None, None
+
+if __name__ == '__main__':
+    import argparse
+    import runpy
+    import sys
+
+    parser = argparse.ArgumentParser(description = 'Run a python script with the pipeline modules instrumented')
+    parser.add_argument('script')
+    parser.add_argument('--json', default = None, help = 'Json file the summary is written to')
+    parser.add_argument('--profile-dir', default = None, help = 'Folder for the per stage cProfile dumps')
+    arguments, script_args = parser.parse_known_args()
+
+    sys.argv = [arguments.script] + script_args
+    with instrumented(profile_dir = arguments.profile_dir) as recorder:
+        runpy.run_path(arguments.script, run_name = '__main__')
+    print(recorder.summary().to_string())
+    if arguments.json:
+        recorder.to_json(arguments.json)
@@ -0,0 +1,48 @@
+"""
+    Python module to measure the peak resident memory of a block of code, shared by the benchmarks & the topic count sweep.
+"""
+
+import os
+import sys
+import threading
+
+class PeakMemoryMonitor:
+    """
+    Context manager sampling the resident memory of the process from a background thread while the block runs.
+    Unlike tracemalloc, it does not slow down the measured code and also sees memory allocated outside of python
+    (spacy, numpy, scipy). Falls back to the process' max RSS where /proc is not available.
+
+    Args:
+        interval (float, optional): Seconds between two samples. Defaults to 0.01.
+    """
+
+    def __init__(self, interval = 0.01):
+        self.interval = interval
+        self.page_size = os.sysconf('SC_PAGE_SIZE') if hasattr(os, 'sysconf') else 4096
+        self.use_proc = os.path.exists('/proc/self/statm')
+
+    def rss(self):
+        if self.use_proc:
+            with open('/proc/self/statm') as statm:
+                return int(statm.read().split()[1]) * self.page_size
+        import resource
+        # ru_maxrss is in kilobytes on linux & in bytes on macOS
+        max_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return max_rss if sys.platform == 'darwin' else max_rss * 1024
+
+    def _sample(self):
+        while not self.stop_event.wait(self.interval):
+            self.peak = max(self.peak, self.rss())
+
+    def __enter__(self):
+        self.start_rss = self.peak = self.rss()
+        self.stop_event = threading.Event()
+        self.thread = threading.Thread(target = self._sample, daemon = True)
+        self.thread.start()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.stop_event.set()
+        self.thread.join()
+        self.peak = max(self.peak, self.rss())
+        return False
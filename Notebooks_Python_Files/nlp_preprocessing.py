@@ -8,20 +8,115 @@
 """
 
 import re
+from functools import lru_cache
 import pandas as pd
-import numpy as np
-from nltk.tokenize import word_tokenize, wordpunct_tokenize, sent_tokenize, RegexpTokenizer, regexp_tokenize, WhitespaceTokenizer
-from nltk.tokenize import MWETokenizer
-from nltk.stem import WordNetLemmatizer 
-from nltk.corpus import stopwords, wordnet
-from nltk.tag import pos_tag
-from nltk.chunk import ne_chunk
-import string
-import spacy
 
-sp_nlp = spacy.load('en', disable=['parser'])
+# The spacy model & the NLTK resources are loaded on first use (and cached for the process),
+# so that importing this module for cleaning alone stays fast.
+SPACY_MODEL_NAME = 'en'
+SPACY_DISABLED_PIPES = ['parser']
 
-def remove_stopwords(text, remove_words_list = stopwords.words('english')):
+# Precompiled patterns used by the corpus level cleaning & stop word functions.
+# URL & email removal stay as separate passes, as a single alternation changes the output for strings like 'ahttp://x@y'.
+URL_PATTERN = re.compile(r'http\S+')
+EMAIL_PATTERN = re.compile(r'\S*@\S+')
+# Group 1 is the punctuation run that gets replaced by a space, the 2nd alternative removes every other non-letter character.
+# Equivalent to running the last two substitutions of cleaning() one after the other.
+PUNCTUATION_NON_LETTER_PATTERN = re.compile(r'([<.*?>;\-!()/,:&—\\]+)|[^a-z\s<.*?>;\-!()/,:&—\\]+')
+PLAIN_TEXT_PATTERN = re.compile(r'[a-z\s]*')
+# Words that NLTK's Treebank tokenizer splits even when the text contains only lowercase letters & spaces
+TREEBANK_SPLIT_WORDS = frozenset(['cannot', 'gimme', 'gonna', 'gotta', 'lemme', 'wanna'])
+
+@lru_cache(maxsize = None)
+def get_spacy_model():
+    """
+    Loads the spacy model (SPACY_MODEL_NAME, with SPACY_DISABLED_PIPES turned off) on the first call
+    and returns the same cached model on every later call.
+
+    Returns:
+        [spacy Language]: Loaded spacy model
+    """
+
+    import spacy
+    return spacy.load(SPACY_MODEL_NAME, disable = SPACY_DISABLED_PIPES)
+
+def spacy_model_version():
+    """
+    Returns a string identifying the spacy library & model versions in use, e.g. 'spacy-2.3.2/en_core_web_sm-2.3.1'.
+    Lemmas & POS tags can change between versions, so this is part of any cached preprocessing configuration.
+    """
+
+    import spacy
+    # The installed model's meta.json is enough, so a fully cached run never has to load the model
+    meta = get_spacy_model().meta if get_spacy_model.cache_info().currsize else _installed_model_meta()
+    return f"spacy-{spacy.__version__}/{meta.get('lang')}_{meta.get('name')}-{meta.get('version')}"
+
+def _installed_model_meta():
+    """
+    Reads the meta.json of SPACY_MODEL_NAME (a package, shortcut link or path) without loading the model.
+    Falls back to loading the model if the meta can't be found.
+    """
+
+    from pathlib import Path
+    from spacy import util
+
+    try:
+        if util.is_package(SPACY_MODEL_NAME):
+            path = util.get_package_path(SPACY_MODEL_NAME)
+        elif hasattr(util, 'is_link') and util.is_link(SPACY_MODEL_NAME):
+            path = util.get_data_path() / SPACY_MODEL_NAME
+        else:
+            path = Path(SPACY_MODEL_NAME)
+        return util.get_model_meta(path)
+    except (OSError, ValueError):
+        return get_spacy_model().meta
+
+@lru_cache(maxsize = None)
+def get_stopwords():
+    """
+    Returns the list of english stop words from the NLTK corpus, read only once per process.
+    """
+
+    from nltk.corpus import stopwords
+    return stopwords.words('english')
+
+@lru_cache(maxsize = None)
+def _get_word_tokenize():
+    """
+    Imports NLTK's word_tokenize on first use.
+    """
+
+    from nltk.tokenize import word_tokenize
+    return word_tokenize
+
+def spacy_disabled_pipes(tagger = True, ent_label = []):
+    """
+    Returns the spacy pipes that can be skipped for the requested processing, to run a lighter pipeline.
+    The entity recognizer is only needed when entity types have to be removed,
+    and the tagger is only needed for lemmatization or POS filtering.
+
+    Args:
+        tagger (bool, optional): Whether lemmas or POS types are required. Defaults to True.
+        ent_label (list, optional): Named Entity types that will be removed. Defaults to empty list.
+
+    Returns:
+        [list of str]: Names of the pipes that can be disabled
+    """
+
+    disable = []
+    if not tagger:
+        disable.append('tagger')
+    if not ent_label:
+        disable.append('ner')
+    return disable
+
+def __getattr__(name):
+    # Keeps 'nlp_preprocessing.sp_nlp' available, while loading the model lazily
+    if name == 'sp_nlp':
+        return get_spacy_model()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+def remove_stopwords(text, remove_words_list = None):
     """
     Removes stop works from the provided text, using the list provided in the calling function 
     or the default list of stop words obtained from NLTK.
@@ -32,7 +127,9 @@ def remove_stopwords(text, remove_words_list = stopwords.words('english')):
     Returns:
         [str]: processed text with stop words removed
     """
-    tokens = word_tokenize(text)
+    if remove_words_list is None:
+        remove_words_list = get_stopwords()
+    tokens = _get_word_tokenize()(text)
     tokens = [token.strip() for token in tokens]
     tokens = [token for token in tokens if token not in remove_words_list]
     return ' '.join(tokens)
@@ -49,12 +146,9 @@ def spacy_lemmatization(text):
         tokens_lemma_remove_pron [str]: Return lemmatized version of the tokens present in the input 'text' argument
     """
     
-    spacy_text = sp_nlp(text)
-    tokens_lemma = [token.lemma_ for token in spacy_text]
-    text_lemma = ' '.join(tokens_lemma)
-    tokens_lemma_remove_pron = re.sub(r'-PRON-', '', text_lemma)
+    spacy_text = get_spacy_model()(text, disable = spacy_disabled_pipes())
     
-    return tokens_lemma_remove_pron
+    return _lemmatize_spacy_doc(spacy_text)
 
 def spacy_pos_filtering(text, pos = [], ent_label = []):
     """
@@ -70,13 +164,66 @@ def spacy_pos_filtering(text, pos = [], ent_label = []):
         filtered_text [str]: Processed text
     """
 
-    spacy_text = sp_nlp(text)
+    spacy_text = get_spacy_model()(text, disable = spacy_disabled_pipes(ent_label = ent_label))
     
     # [print(token, token.text, token.pos_, token.ent_type_) for token in spacy_text]
-    tokens = [token.text for token in spacy_text if ((token.pos_ in pos) and (token.ent_type_ not in ent_label))]
     
+    return _pos_filter_spacy_doc(spacy_text, pos, ent_label)
+
+def spacy_batch_processing(texts, pos = [], ent_label = [], batch_size = 1000, n_process = 1):
+    """
+    Corpus level version of spacy_lemmatization & spacy_pos_filtering.
+    Streams all the texts through the spacy model's pipe and parses every document only once,
+    producing both the lemmatized text & the POS/Entity filtered text from the same parse.
+    Output is identical to calling the two per-row functions on each text.
+
+    Args:
+        texts (iterable of str): Texts (reviews) to be processed, e.g. a pandas Series or a list
+        pos (list, optional): List of POS types that should be kept. Defaults to empty list, same as spacy_pos_filtering
+        ent_label (list, optional): List of Named Entity types that should be removed. Defaults to empty list
+        batch_size (int, optional): Number of texts buffered & processed together by spacy. Defaults to 1000.
+        n_process (int, optional): Number of processes used by spacy. Defaults to 1 (-1 uses all the cores).
+
+    Returns:
+        Returns a tuple containing 2 elements, both in the same order as the input texts
+        lemma_texts [list of str]: Lemmatized texts, same as spacy_lemmatization
+        filtered_texts [list of str]: POS/Entity filtered texts, same as spacy_pos_filtering
+    """
+
+    lemma_texts = []
+    filtered_texts = []
+
+    spacy_texts = get_spacy_model().pipe(texts, batch_size = batch_size, n_process = n_process,
+                                         disable = spacy_disabled_pipes(ent_label = ent_label))
+
+    for spacy_text in spacy_texts:
+        lemma_texts.append(_lemmatize_spacy_doc(spacy_text))
+        filtered_texts.append(_pos_filter_spacy_doc(spacy_text, pos, ent_label))
+
+    return lemma_texts, filtered_texts
+
+def _lemmatize_spacy_doc(spacy_text):
+    """
+    Joins the lemmas of an already parsed spacy document & removes the '-PRON-' placeholder lemma.
+    Shared by the per-row & batch functions so both return the same output.
+    """
+
+    tokens_lemma = [token.lemma_ for token in spacy_text]
+    text_lemma = ' '.join(tokens_lemma)
+    tokens_lemma_remove_pron = re.sub(r'-PRON-', '', text_lemma)
+
+    return tokens_lemma_remove_pron
+
+def _pos_filter_spacy_doc(spacy_text, pos, ent_label):
+    """
+    Keeps the tokens of an already parsed spacy document whose POS type is in 'pos'
+    and whose entity type is not in 'ent_label'.
+    """
+
+    tokens = [token.text for token in spacy_text if ((token.pos_ in pos) and (token.ent_type_ not in ent_label))]
+
     filtered_text = ' '.join(tokens)
-    
+
     return filtered_text
 
 
@@ -106,4 +253,76 @@ def cleaning(text):
 
     return text
 
-                
+
+def clean_texts(texts):
+    """
+    Corpus level version of cleaning(), using precompiled patterns & a single pass for
+    punctuation and non-letter removal. Output is identical to mapping cleaning() over the texts.
+
+    Args:
+        texts (pd.Series or list of str): Texts (reviews) to be cleaned
+
+    Returns:
+        [pd.Series or list of str]: cleaned texts; a Series with the same index is returned if a Series was provided
+    """
+
+    cleaned = [_clean_text(text) for text in texts]
+
+    if isinstance(texts, pd.Series):
+        return pd.Series(cleaned, index = texts.index, name = texts.name)
+    return cleaned
+
+def remove_stopwords_texts(texts, remove_words_list = None):
+    """
+    Corpus level version of remove_stopwords(). The stop words are converted into a frozenset once
+    for the whole corpus, instead of a list lookup for every token.
+    Texts containing only lowercase letters & whitespace (the output of cleaning) skip NLTK's tokenizer,
+    since it would only split them on whitespace. Output is identical to mapping remove_stopwords() over the texts.
+
+    Args:
+        texts (pd.Series or list of str): Texts (reviews) from which stop words have to be removed
+        remove_words_list ([list of strings], optional): Custom list of stop words to be used. Defaults to stopwords list from the NLTK corpus.
+
+    Returns:
+        [pd.Series or list of str]: processed texts; a Series with the same index is returned if a Series was provided
+    """
+
+    if remove_words_list is None:
+        remove_words_list = get_stopwords()
+    remove_words_set = frozenset(remove_words_list)
+
+    processed = [_remove_stopwords_text(text, remove_words_set) for text in texts]
+
+    if isinstance(texts, pd.Series):
+        return pd.Series(processed, index = texts.index, name = texts.name)
+    return processed
+
+def _clean_text(text):
+    """
+    Same steps as cleaning(), using the precompiled patterns.
+    """
+
+    text = text.lower()
+    text = URL_PATTERN.sub('', text)
+    text = EMAIL_PATTERN.sub('', text)
+    text = PUNCTUATION_NON_LETTER_PATTERN.sub(_punctuation_replacement, text)
+
+    return text
+
+def _punctuation_replacement(match):
+    """
+    Punctuation runs are substituted by a space, all other non-letter characters are removed.
+    """
+
+    return ' ' if match.group(1) else ''
+
+def _remove_stopwords_text(text, remove_words_set):
+    """
+    Same steps as remove_stopwords(), taking in the stop words as a set.
+    """
+
+    tokens = text.split()
+    if (PLAIN_TEXT_PATTERN.fullmatch(text) is None) or (not TREEBANK_SPLIT_WORDS.isdisjoint(tokens)):
+        tokens = [token.strip() for token in _get_word_tokenize()(text)]
+    tokens = [token for token in tokens if token not in remove_words_set]
+    return ' '.join(tokens)
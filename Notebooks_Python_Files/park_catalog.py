@@ -0,0 +1,137 @@
+"""
+    Python file contains the multi-park catalog for the recommenders system.
+
+    Every park's attractions-topics scores are stored as their own shard: a folder holding the L2 normalized
+    float32 matrix & the topic means as .npy files, plus a json file with the attraction & topic names.
+    Shards are memory-mapped on the first request for their park and kept in an LRU cache within a memory budget,
+    so serving many parks does not require loading all of them up front.
+"""
+
+import json
+import os
+import threading
+from collections import OrderedDict, defaultdict
+
+import numpy as np
+
+from recommender_and_other_functions import AttractionRecommender
+
+SHARD_MATRIX_FILE = 'normalized_scores.npy'
+SHARD_MEANS_FILE = 'average_topic_scores.npy'
+SHARD_NAMES_FILE = 'names.json'
+
+def write_park_shard(directory, park_id, df_attractions):
+    """
+    Writes a park's attractions-topics scores as a shard of the catalog in 'directory'.
+
+    Input: directory [str] - Folder of the catalog; the shard is written to directory/park_id
+           park_id [str] - Identifier of the park, e.g. 'yosemite'
+           df_attractions [DataFrame] - Scores across each topic & attraction, same as Attractions_Topics_Summary_Scores.csv
+    """
+
+    recommender = AttractionRecommender(df_attractions)
+    shard_directory = os.path.join(directory, park_id)
+    os.makedirs(shard_directory, exist_ok = True)
+
+    np.save(os.path.join(shard_directory, SHARD_MATRIX_FILE), recommender.normalized_matrix)
+    np.save(os.path.join(shard_directory, SHARD_MEANS_FILE), recommender.average_topic_scores)
+    with open(os.path.join(shard_directory, SHARD_NAMES_FILE), 'w') as names_file:
+        json.dump({'attractions': recommender.attractions.tolist(), 'topics': recommender.topics}, names_file)
+
+class ParkCatalog:
+    """
+    Lazily loaded, LRU cached collection of per park recommenders.
+
+    Input: directory [str] - Folder of the catalog, with one shard folder per park (see write_park_shard)
+           memory_budget_mb [float] - Maximum size of the cached shard matrices. The least recently used parks are
+                                      evicted once it is exceeded (the park just requested is always kept). Defaults to 256.
+    """
+
+    def __init__(self, directory, memory_budget_mb = 256):
+        self.directory = directory
+        self.memory_budget = memory_budget_mb * 2 ** 20
+        self.cache = OrderedDict()
+        self.cache_size = 0
+        self.lock = threading.Lock()
+        self.loads = 0
+        self.evictions = 0
+
+    def park_ids(self):
+        """
+        Parks available in the catalog, read from the folder names without loading any shard.
+        """
+
+        return sorted(name for name in os.listdir(self.directory)
+                      if os.path.exists(os.path.join(self.directory, name, SHARD_NAMES_FILE)))
+
+    def recommender(self, park_id):
+        """
+        Returns the park's AttractionRecommender, memory-mapping its shard on first use.
+        """
+
+        with self.lock:
+            if park_id in self.cache:
+                self.cache.move_to_end(park_id)
+                return self.cache[park_id]
+
+            recommender = self._load_shard(park_id)
+            self.cache[park_id] = recommender
+            self.cache_size += recommender.normalized_matrix.nbytes
+            self.loads += 1
+
+            while self.cache_size > self.memory_budget and len(self.cache) > 1:
+                _, evicted = self.cache.popitem(last = False)
+                self.cache_size -= evicted.normalized_matrix.nbytes
+                self.evictions += 1
+
+            return recommender
+
+    def _load_shard(self, park_id):
+        shard_directory = os.path.join(self.directory, park_id)
+        if not os.path.exists(os.path.join(shard_directory, SHARD_NAMES_FILE)):
+            raise KeyError(f'Unknown park {park_id!r}')
+
+        with open(os.path.join(shard_directory, SHARD_NAMES_FILE)) as names_file:
+            names = json.load(names_file)
+        return AttractionRecommender.from_arrays(names['attractions'], names['topics'],
+                                                 np.load(os.path.join(shard_directory, SHARD_MEANS_FILE)),
+                                                 np.load(os.path.join(shard_directory, SHARD_MATRIX_FILE), mmap_mode = 'r'))
+
+    def recommend(self, park_id, user_weights = defaultdict(int), k = 3, exclude = None):
+        """
+        Returns the top 'k' recommended attractions of a single park, same as AttractionRecommender.recommend.
+        """
+
+        return self.recommender(park_id).recommend(user_weights, k, exclude)
+
+    def recommend_across_parks(self, user_weights = defaultdict(int), park_ids = None, k = 3, exclude = None):
+        """
+        Returns the top 'k' attractions across several parks. Every park is scored against its own topic means,
+        and the per park top 'k' are merged on their cosine similarity.
+
+        Input: user_weights [Dictionary] - Weights input by the user for the desired topics
+               park_ids [List of str] - Parks to search. Defaults to every park in the catalog.
+               k [int] - Number of recommendations. Defaults to 3.
+               exclude [List of tuples] - (park_id, attraction) pairs that should not be recommended. Defaults to None.
+        Output: Recommendations [List of tuples] - (park_id, attraction, similarity) in descending order of similarity
+        """
+
+        excluded = defaultdict(list)
+        for park_id, attraction in (exclude or ()):
+            excluded[park_id].append(attraction)
+
+        candidates = []
+        for park_id in (park_ids or self.park_ids()):
+            for attraction, similarity in self.recommender(park_id).recommend_scored(user_weights, k, excluded[park_id]):
+                candidates.append((park_id, attraction, similarity))
+
+        return sorted(candidates, key = lambda candidate: candidate[2], reverse = True)[:k]
+
+    def stats(self):
+        """
+        Cache statistics: parks currently loaded, their total size, number of shard loads & evictions.
+        """
+
+        with self.lock:
+            return {'cached_parks': list(self.cache), 'cache_size_mb': self.cache_size / 2 ** 20,
+                    'loads': self.loads, 'evictions': self.evictions}
@@ -0,0 +1,191 @@
+"""
+    End-to-end benchmark of the review pipeline on synthetic Trip Advisor like data, at several corpus sizes.
+
+    Every stage (html parse, clean, lemmatize, stop words, vectorize, topic fit, aggregation & recommend query) is timed
+    separately, along with its throughput & peak memory. Results are written as json and can be compared against a
+    stored baseline, flagging the stages that got slower. Everything runs offline (the spacy model & NLTK stop words
+    have to be installed locally).
+
+    To run, cd into this directory & enter:
+        python pipeline_benchmark.py --scales 1000 10000 --output results.json --baseline baseline.json
+"""
+
+import argparse
+import json
+import os
+import platform
+import sys
+import time
+from datetime import datetime, timezone
+
+import numpy as np
+import pandas as pd
+
+from benchmarks import FixtureFetcher, synthetic_listing_page, synthetic_reviews
+from memory_monitor import PeakMemoryMonitor
+
+SCALES = [1000, 10000, 100000, 1000000]
+
+def run_stage(results, scale, stage, n_items, function, *args, **kwargs):
+    """
+    Runs a single stage, appends its timing & memory record to results and returns the stage output.
+    """
+
+    with PeakMemoryMonitor() as memory:
+        start = time.perf_counter()
+        output = function(*args, **kwargs)
+        seconds = time.perf_counter() - start
+
+    results.append({'scale': scale, 'stage': stage, 'n_items': n_items, 'seconds': seconds,
+                    'items_per_second': n_items / seconds if seconds else None,
+                    'peak_rss_mb': memory.peak / 2 ** 20,
+                    'peak_increase_mb': (memory.peak - memory.start_rss) / 2 ** 20})
+    return output
+
+def synthetic_html_corpus(n_reviews, reviews_per_page = 5, seed = 0):
+    """
+    Listing pages & review pages (keyed by review link) holding n_reviews synthetic reviews.
+    """
+
+    listing_pages = []
+    review_pages = {}
+    for page_id in range(max(1, n_reviews // reviews_per_page)):
+        page_html, pages = synthetic_listing_page(reviews_per_page, page_id = page_id, seed = seed)
+        listing_pages.append(page_html)
+        review_pages.update(pages)
+    return listing_pages, review_pages
+
+def benchmark_pipeline(n_reviews = 10000, n_topics = 18, n_attractions = 50, n_queries = 1000,
+                       max_html_reviews = 1000, max_spacy_reviews = 10000, seed = 0):
+    """
+    Runs every stage of the pipeline on n_reviews synthetic reviews.
+
+    Parsing the padded html pages & running spacy are by far the slowest stages, so they run on a sample of at most
+    max_html_reviews / max_spacy_reviews reviews (None runs them on the whole corpus); their throughput is still
+    reported per review. As in the notebooks, stop words are removed from the lemmatized texts; beyond the spacy
+    sample, the cleaned texts stand in for the lemmas, so that the stages after lemmatization run on the whole corpus.
+
+    Args:
+        n_reviews (int, optional): Number of synthetic reviews. Defaults to 10000.
+        n_topics (int, optional): Number of NMF topics. Defaults to 18.
+        n_attractions (int, optional): Number of attractions the reviews are spread over. Defaults to 50.
+        n_queries (int, optional): Number of users (3 random priorities each) for the recommend query stage. Defaults to 1000.
+        max_html_reviews (int, optional): Reviews parsed from html. Defaults to 1000.
+        max_spacy_reviews (int, optional): Reviews lemmatized by spacy. Defaults to 10000.
+        seed (int, optional): Seed of the synthetic data. Defaults to 0.
+
+    Returns:
+        [list of dict]: One record per stage with the scale, n_items, seconds, items_per_second, peak_rss_mb & peak_increase_mb
+    """
+
+    import nlp_preprocessing
+    import scraping
+    import topic_modeling
+    from recommender_and_other_functions import AttractionRecommender
+    from sklearn.feature_extraction.text import TfidfVectorizer
+
+    results = []
+    rng = np.random.RandomState(seed)
+
+    n_html = min(n_reviews, max_html_reviews or n_reviews)
+    listing_pages, review_pages = synthetic_html_corpus(n_html, seed = seed)
+    fetcher = FixtureFetcher(review_pages)
+    run_stage(results, n_reviews, 'html_parse', len(review_pages),
+              lambda: [scraping.ta_attraction_reviews_parser(scraping.ta_listing_page_soup(page_html), fetcher)
+                       for page_html in listing_pages])
+    del listing_pages, review_pages, fetcher
+
+    reviews = synthetic_reviews(n_reviews, seed = seed)
+    cleaned = run_stage(results, n_reviews, 'clean', n_reviews, nlp_preprocessing.clean_texts, reviews)
+
+    n_spacy = min(n_reviews, max_spacy_reviews or n_reviews)
+    lemma_texts, _ = run_stage(results, n_reviews, 'lemmatize', n_spacy, nlp_preprocessing.spacy_batch_processing,
+                               cleaned[:n_spacy].tolist())
+
+    lemma_texts.extend(cleaned[n_spacy:].tolist())
+    processed = run_stage(results, n_reviews, 'stopwords', n_reviews, nlp_preprocessing.remove_stopwords_texts, lemma_texts)
+
+    vectorizer = TfidfVectorizer(min_df = 5, max_df = 0.95, dtype = np.float32)
+    doc_word = run_stage(results, n_reviews, 'vectorize', n_reviews, vectorizer.fit_transform, processed)
+
+    _, _, topic_matrices = run_stage(results, n_reviews, 'topic_fit', n_reviews, topic_modeling.nmf_topic_modeling,
+                                     doc_word, vectorizer.get_feature_names(), n_topics, output = 'arrays')
+
+    doc_topic_df = topic_matrices.doc_topic_df()
+    doc_topic_df['attraction_name'] = [f'Attraction {i % n_attractions}' for i in range(n_reviews)]
+    df_attractions = run_stage(results, n_reviews, 'aggregation', n_reviews,
+                               lambda: doc_topic_df.groupby('attraction_name').mean())
+
+    topics = df_attractions.columns.tolist()
+    users_weights = [{topic: 1 for topic in rng.choice(topics, 3, replace = False)} for _ in range(n_queries)]
+    recommender = AttractionRecommender(df_attractions)
+    run_stage(results, n_reviews, 'recommend_query', n_queries,
+              lambda: [recommender.recommend(user_weights) for user_weights in users_weights])
+
+    return results
+
+def write_results(results, path):
+    """
+    Writes the stage records to a json file, along with the python, platform & library versions they were measured with.
+    """
+
+    import sklearn
+    import spacy
+
+    payload = {'created_at': datetime.now(timezone.utc).isoformat(),
+               'environment': {'python': platform.python_version(), 'platform': platform.platform(),
+                               'processor': platform.processor(), 'cpu_count': os.cpu_count(),
+                               'numpy': np.__version__, 'pandas': pd.__version__,
+                               'sklearn': sklearn.__version__, 'spacy': spacy.__version__},
+               'results': results}
+    with open(path, 'w') as results_file:
+        json.dump(payload, results_file, indent = 2)
+
+def compare_to_baseline(results, baseline_path, tolerance = 0.2):
+    """
+    Compares the stage timings to the ones of a stored results file, matched on scale & stage.
+
+    Args:
+        results (list of dict): Stage records, as returned by benchmark_pipeline
+        baseline_path (str): Results json written by write_results
+        tolerance (float, optional): Allowed slowdown before a stage is flagged as a regression. Defaults to 0.2 (20%).
+
+    Returns:
+        [pd.DataFrame]: seconds, baseline_seconds, ratio & regression of every stage present in both
+    """
+
+    with open(baseline_path) as baseline_file:
+        baseline = pd.DataFrame(json.load(baseline_file)['results'])
+
+    comparison = pd.DataFrame(results).merge(baseline[['scale', 'stage', 'seconds', 'peak_rss_mb']],
+                                             on = ['scale', 'stage'], suffixes = ('', '_baseline'))
+    comparison['ratio'] = comparison.seconds / comparison.seconds_baseline
+    comparison['regression'] = comparison.ratio > 1 + tolerance
+    return comparison.set_index(['scale', 'stage'])[['seconds', 'seconds_baseline', 'ratio', 'peak_rss_mb',
+                                                      'peak_rss_mb_baseline', 'regression']]
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description = 'Run the end-to-end pipeline benchmark on synthetic reviews')
+    parser.add_argument('--scales', type = int, nargs = '+', default = SCALES[:2],
+                        help = f'Numbers of reviews, e.g. {" ".join(map(str, SCALES))}')
+    parser.add_argument('--output', default = None, help = 'Json file the results are written to')
+    parser.add_argument('--baseline', default = None, help = 'Results json to compare against')
+    parser.add_argument('--tolerance', type = float, default = 0.2, help = 'Allowed slowdown against the baseline')
+    parser.add_argument('--max-html-reviews', type = int, default = 1000, help = '0 parses the html of every review')
+    parser.add_argument('--max-spacy-reviews', type = int, default = 10000, help = '0 lemmatizes every review')
+    arguments = parser.parse_args()
+
+    results = []
+    for scale in arguments.scales:
+        results.extend(benchmark_pipeline(scale, max_html_reviews = arguments.max_html_reviews or None,
+                                          max_spacy_reviews = arguments.max_spacy_reviews or None))
+    print(pd.DataFrame(results).set_index(['scale', 'stage']))
+
+    if arguments.output:
+        write_results(results, arguments.output)
+
+    if arguments.baseline:
+        comparison = compare_to_baseline(results, arguments.baseline, arguments.tolerance)
+        print(comparison)
+        if comparison.regression.any():
+            sys.exit(1)
@@ -0,0 +1,178 @@
+"""
+    Persistent, content addressed cache for the NLP preprocessing pipeline
+    (cleaning -> lemmatization -> stop word removal, plus POS/Entity filtering).
+
+    Every review is stored in a local SQLite file under a hash of its text and of the pipeline configuration
+    (stop words, POS types, entity labels & spacy model version), so reruns only process new or changed reviews
+    and changing any part of the configuration automatically misses the old entries.
+"""
+
+import hashlib
+import json
+import sqlite3
+
+import pandas as pd
+
+import nlp_preprocessing
+
+DEFAULT_CACHE_PATH = '../Data/preprocessing_cache.sqlite'
+
+# Bump whenever the preprocessing steps themselves change, so that old entries are no longer used
+PIPELINE_VERSION = 1
+
+PREPROCESSED_COLUMNS = ['review_clean', 'review_lemma', 'review_remove_stop_words', 'review_pos_ent_filter']
+
+# SQLite limits the number of parameters in a single statement
+SQLITE_MAX_PARAMETERS = 900
+
+class PreprocessingCache:
+    """
+    SQLite backed store of preprocessed reviews, along with hit/miss statistics for the current process.
+
+    Args:
+        path (str, optional): Location of the SQLite file. Defaults to DEFAULT_CACHE_PATH.
+    """
+
+    def __init__(self, path = DEFAULT_CACHE_PATH):
+        self.path = path
+        self.connection = sqlite3.connect(path)
+        self.connection.execute('''
+            CREATE TABLE IF NOT EXISTS preprocessed_reviews (
+                key TEXT PRIMARY KEY,
+                config TEXT NOT NULL,
+                review_clean TEXT,
+                review_lemma TEXT,
+                review_remove_stop_words TEXT,
+                review_pos_ent_filter TEXT
+            ) WITHOUT ROWID''')
+        self.hits = 0
+        self.misses = 0
+
+    def get_many(self, keys):
+        """
+        Returns a dictionary mapping every key found in the cache to its tuple of preprocessed texts.
+        """
+
+        keys = list(keys)
+        found = {}
+        for start in range(0, len(keys), SQLITE_MAX_PARAMETERS):
+            chunk = keys[start:start + SQLITE_MAX_PARAMETERS]
+            placeholders = ','.join('?' * len(chunk))
+            rows = self.connection.execute(
+                f'SELECT key, {", ".join(PREPROCESSED_COLUMNS)} FROM preprocessed_reviews WHERE key IN ({placeholders})',
+                chunk)
+            found.update((row[0], row[1:]) for row in rows)
+
+        self.hits += len(found)
+        self.misses += len(keys) - len(found)
+        return found
+
+    def put_many(self, config, entries):
+        """
+        Stores the preprocessed texts under their keys.
+
+        Args:
+            config (str): Configuration hash the entries were produced with
+            entries (dict): Maps each key to a tuple of the texts in PREPROCESSED_COLUMNS order
+        """
+
+        with self.connection:
+            self.connection.executemany(
+                'INSERT OR REPLACE INTO preprocessed_reviews VALUES (?, ?, ?, ?, ?, ?)',
+                [(key, config) + tuple(values) for key, values in entries.items()])
+
+    def prune(self, keep_config):
+        """
+        Deletes every entry that was not produced with the provided configuration hash & returns the number deleted.
+        """
+
+        with self.connection:
+            deleted = self.connection.execute('DELETE FROM preprocessed_reviews WHERE config != ?', (keep_config,)).rowcount
+        self.connection.execute('VACUUM')
+        return deleted
+
+    def stats(self):
+        """
+        Returns the hit/miss counts of this process along with the number of entries stored in the cache.
+        """
+
+        lookups = self.hits + self.misses
+        entries = self.connection.execute('SELECT COUNT(*) FROM preprocessed_reviews').fetchone()[0]
+        return {'hits': self.hits, 'misses': self.misses,
+                'hit_rate': self.hits / lookups if lookups else 0.0, 'entries': entries}
+
+    def close(self):
+        self.connection.close()
+
+def config_hash(remove_words_list = None, pos = [], ent_label = []):
+    """
+    Hashes every setting that changes the preprocessed output. Order of the stop words, POS types & entity labels is ignored,
+    as they are only used for membership checks.
+
+    Returns:
+        [str]: hex digest identifying the pipeline configuration
+    """
+
+    if remove_words_list is None:
+        remove_words_list = nlp_preprocessing.get_stopwords()
+
+    config = {'pipeline_version': PIPELINE_VERSION,
+              'spacy_model': nlp_preprocessing.spacy_model_version(),
+              'stop_words': sorted(set(remove_words_list)),
+              'pos': sorted(set(pos)),
+              'ent_label': sorted(set(ent_label))}
+
+    return hashlib.sha256(json.dumps(config).encode('utf-8')).hexdigest()
+
+def review_key(text, config):
+    """
+    Content address of a review under a given configuration hash.
+    """
+
+    return hashlib.sha256(f'{config}\0{text}'.encode('utf-8')).hexdigest()
+
+def cached_preprocessing(texts, cache, remove_words_list = None, pos = [], ent_label = [], batch_size = 1000, n_process = 1):
+    """
+    Runs the preprocessing pipeline on the texts, only processing the reviews missing from the cache.
+    Same steps as the preprocessing notebook: the cleaned text is lemmatized & has its stop words removed,
+    and separately the cleaned text is POS/Entity filtered & has its stop words removed.
+
+    Args:
+        texts (pd.Series or list of str): Raw reviews
+        cache (PreprocessingCache): Cache to read from & write the newly processed reviews to
+        remove_words_list ([list of strings], optional): Stop words to be removed. Defaults to stopwords list from the NLTK corpus.
+        pos (list, optional): List of POS types that should be kept. Defaults to empty list
+        ent_label (list, optional): List of Named Entity types that should be removed. Defaults to empty list
+        batch_size (int, optional): Batch size used by spacy for the missing reviews. Defaults to 1000.
+        n_process (int, optional): Number of processes used by spacy for the missing reviews. Defaults to 1.
+
+    Returns:
+        [pd.DataFrame]: One row per input review (same index if a Series was provided) with the PREPROCESSED_COLUMNS
+    """
+
+    if remove_words_list is None:
+        remove_words_list = nlp_preprocessing.get_stopwords()
+
+    config = config_hash(remove_words_list, pos, ent_label)
+    texts = texts if isinstance(texts, pd.Series) else pd.Series(list(texts))
+    keys = [review_key(text, config) for text in texts]
+
+    found = cache.get_many(set(keys))
+
+    # Duplicate reviews are processed only once
+    missing = {}
+    for key, text in zip(keys, texts):
+        if key not in found:
+            missing[key] = text
+
+    if missing:
+        clean = nlp_preprocessing.clean_texts(list(missing.values()))
+        lemma, pos_filtered = nlp_preprocessing.spacy_batch_processing(clean, pos, ent_label, batch_size, n_process)
+        no_stop_words = nlp_preprocessing.remove_stopwords_texts(lemma, remove_words_list)
+        pos_filtered = nlp_preprocessing.remove_stopwords_texts(pos_filtered, remove_words_list)
+
+        processed = dict(zip(missing.keys(), zip(clean, lemma, no_stop_words, pos_filtered)))
+        cache.put_many(config, processed)
+        found.update(processed)
+
+    return pd.DataFrame([found[key] for key in keys], index = texts.index, columns = PREPROCESSED_COLUMNS)
@@ -0,0 +1,48 @@
+"""
+    Top-k selection shared by the recommender & the topic interpretation functions. Both need the same order as a
+    full sort, including for tied scores: the topic functions keep tied rows in index order (like a stable descending
+    sort), while the recommender returns the highest index first (like reversing np.argsort, as yosemite_attraction_reco does).
+"""
+
+import numpy as np
+
+TIE_ORDERS = ('lowest', 'highest')
+
+def top_k_indices(scores, k, excluded = (), ties = 'lowest'):
+    """
+    Indices of the 'k' highest scores, in descending order, using argpartition instead of sorting every score.
+    Excluded indices are never returned, so fewer than 'k' indices come back if not enough are left.
+
+    Args:
+        scores (1D Numpy array): Scores to be ranked
+        k (int): Number of indices to be returned
+        excluded (list of int, optional): Indices that should not be returned. Defaults to none.
+        ties (str, optional): Order of tied scores, 'lowest' index first (stable descending sort) or 'highest' index
+                              first (reversed stable ascending sort, which is what reversing np.argsort gives for
+                              the catalog sizes yosemite_attraction_reco is used with). Defaults to 'lowest'.
+
+    Returns:
+        [Numpy array of int]: Indices of the top scores
+    """
+
+    if ties not in TIE_ORDERS:
+        raise ValueError(f'ties should be one of {TIE_ORDERS}, got {ties!r}')
+
+    if len(excluded):
+        scores = scores.astype(np.float64)
+        scores[excluded] = -np.inf
+
+    n = len(scores)
+    k = min(k, n)
+    if k <= 0:
+        return np.array([], dtype = int)
+
+    # Every score tied with the k-th highest one is a candidate, so ties at the cut-off are also resolved by index
+    threshold = scores[np.argpartition(scores, n - k)[n - k:]].min()
+    candidates = np.flatnonzero(scores >= threshold)
+    if ties == 'lowest':
+        top = candidates[np.lexsort((candidates, -scores[candidates]))][:k]
+    else:
+        top = candidates[np.lexsort((candidates, scores[candidates]))[::-1]][:k]
+
+    return top[scores[top] > -np.inf] if len(excluded) else top
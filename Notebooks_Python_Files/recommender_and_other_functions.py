@@ -3,11 +3,16 @@
 
 """
 
+import time
+from dataclasses import dataclass
 import pandas as pd
 import numpy as np
+from joblib import Parallel, delayed
+from sklearn.base import clone
 from sklearn.linear_model import LogisticRegression
 from collections import defaultdict
 from sklearn.metrics.pairwise import cosine_similarity
+from ranking import top_k_indices
 
 import seaborn as sns
 import matplotlib.pyplot as plt
@@ -19,14 +24,15 @@ from imblearn.over_sampling import RandomOverSampler, SMOTE
 from sklearn.metrics import roc_auc_score, roc_curve, fbeta_score, make_scorer, classification_report, confusion_matrix
 from sklearn.metrics import log_loss, precision_score, recall_score, accuracy_score
 
-def yosemite_attraction_reco(df_attractions, user_weights = defaultdict(int)):
+def yosemite_attraction_reco(df_attractions, user_weights = defaultdict(int), k = 3):
     """
     Returns a prioritized list of recommended attractionsn, based on desired characteristics input by the user.
     
     Input: df_attractions [DataFrame] - Scores across each topic & attraction
            user_weights [Default Dictionary] - Weights input by the user for the desired topics
+           k [int] - Number of recommendations to be returned. Defaults to 3.
            
-    Output: Recommendations [List] - Top 3 recommendations sorted in order based on user weight inputs.
+    Output: Recommendations [List] - Top k recommendations sorted in order based on user weight inputs.
     
     Please note, the code for this recommenders was sourced from Julia Qiao's implementation
     for news outlet recommendations.
@@ -47,17 +53,374 @@ def yosemite_attraction_reco(df_attractions, user_weights = defaultdict(int)):
     # Getting the indices in a sorted order from lowest to highest 
     index_sort = np.argsort(similarity_matrix)
 
-    # List of top 3 suggested attractions. The negative indexing reverses the order as the indices are sorted smallest to biggest.
-    suggested_attractions = df_attractions.index[index_sort][-1:-4:-1].values.tolist()
+    # List of top k suggested attractions. The negative indexing reverses the order as the indices are sorted smallest to biggest.
+    suggested_attractions = df_attractions.index[index_sort][:-(k + 1):-1].values.tolist()
     
     return suggested_attractions
 
+class AttractionRecommender:
+    """
+    Precomputed version of yosemite_attraction_reco, built once from the attractions-topics score matrix.
+    The topic means & the L2 normalized attraction matrix are computed up front, so every query is a single
+    matrix-vector product followed by a partial (argpartition) top-k selection. Many users can be scored at once
+    with a single matrix multiplication.
+    Rankings are the same as yosemite_attraction_reco, including the order of tied attractions.
+
+    For large catalogs, an index can be built so that only part of the catalog is scored per query:
+        'balltree' - exact search with sklearn's BallTree over the normalized vectors
+                     (the euclidean distance between unit vectors ranks the same as the cosine similarity)
+        'ivf' - approximate search with a ClusteredIndex, scoring only the attractions of the closest clusters
+
+    Input: df_attractions [DataFrame] - Scores across each topic & attraction
+           dtype [numpy dtype] - Precision of the normalized matrix. Defaults to float32.
+           index [str] - None (brute force), 'balltree' or 'ivf'. Defaults to None.
+           n_lists [int] - Number of clusters of the 'ivf' index. Defaults to the square root of the # of attractions.
+           n_probe [int] - Number of clusters scored per query by the 'ivf' index. Defaults to 8.
+    """
+
+    def __init__(self, df_attractions, dtype = np.float32, index = None, n_lists = None, n_probe = 8):
+        self._set_arrays(df_attractions.index.values, df_attractions.columns.tolist(), df_attractions.mean(axis = 0).values,
+                         _l2_normalize(df_attractions.values.astype(np.float64)).astype(dtype))
+        self._build_index(index, n_lists, n_probe)
+
+    @classmethod
+    def from_arrays(cls, attractions, topics, average_topic_scores, normalized_matrix, index = None, n_lists = None, n_probe = 8):
+        """
+        Builds the recommender from already precomputed arrays (e.g. memory-mapped from a park shard), without copying them.
+
+        Input: attractions [Array of str] - Attraction names, one per row of normalized_matrix
+               topics [List of str] - Topic names, one per column of normalized_matrix
+               average_topic_scores [Numpy array] - Mean score of every topic across the attractions
+               normalized_matrix [2D Numpy array] - L2 normalized attractions-topics scores
+        """
+
+        recommender = cls.__new__(cls)
+        recommender._set_arrays(np.asarray(attractions), list(topics), np.asarray(average_topic_scores), normalized_matrix)
+        recommender._build_index(index, n_lists, n_probe)
+        return recommender
+
+    def _set_arrays(self, attractions, topics, average_topic_scores, normalized_matrix):
+        self.attractions = attractions
+        self.attraction_positions = {attraction: position for position, attraction in enumerate(self.attractions)}
+        self.topics = topics
+        self.average_topic_scores = average_topic_scores
+        self.normalized_matrix = normalized_matrix
+
+    def _build_index(self, index, n_lists, n_probe):
+        self.index_type = index
+        if index == 'balltree':
+            from sklearn.neighbors import BallTree
+            self.index = BallTree(self.normalized_matrix)
+        elif index == 'ivf':
+            self.index = ClusteredIndex(self.normalized_matrix, n_lists, n_probe)
+        elif index is None:
+            self.index = None
+        else:
+            raise ValueError(f"index should be None, 'balltree' or 'ivf', got {index!r}")
+
+    @classmethod
+    def from_csv(cls, path = "../Data/Attractions_Topics_Summary_Scores.csv", dtype = np.float32, **index_kwargs):
+        """
+        Builds the recommender from the attractions-topics scores csv (attraction names as the first column).
+        """
+
+        return cls(pd.read_csv(path, index_col = 0), dtype, **index_kwargs)
+
+    def user_vectors(self, users_weights):
+        """
+        Converts user weights into weighted topic score vectors, same as the user vector of yosemite_attraction_reco.
+
+        Input: users_weights [List of dictionaries or 2D array] - Weights per topic for each user. Missing topics get a weight of 0.
+        Output: user_vectors [2D Numpy array] - One row per user & one column per topic
+        """
+
+        if isinstance(users_weights, np.ndarray):
+            weights = users_weights.reshape(-1, len(self.topics))
+        else:
+            weights = np.array([[user_weights.get(topic, 0) for topic in self.topics] for user_weights in users_weights],
+                               dtype = np.float64).reshape(-1, len(self.topics))
+
+        return self.average_topic_scores * weights
+
+    def recommend(self, user_weights = defaultdict(int), k = 3, exclude = None):
+        """
+        Returns the top 'k' recommended attractions for a single user.
+
+        Input: user_weights [Dictionary] - Weights input by the user for the desired topics
+               k [int] - Number of recommendations. Defaults to 3.
+               exclude [List] - Attractions that should not be recommended, e.g. already visited ones. Defaults to None.
+        Output: Recommendations [List] - Top k attractions sorted in order based on user weight inputs.
+        """
+
+        return self.recommend_batch([user_weights], k, None if exclude is None else [exclude])[0]
+
+    def recommend_batch(self, users_weights, k = 3, exclude = None):
+        """
+        Scores every user & returns the top 'k' recommended attractions for each of them.
+        Without an index, all the users are scored with one matrix multiplication.
+
+        Input: users_weights [List of dictionaries or 2D array] - Weights per topic for each user, see user_vectors
+               k [int] - Number of recommendations per user. Defaults to 3.
+               exclude [List of lists] - Attractions that should not be recommended to each user, one list per user. Defaults to None.
+        Output: Recommendations [List of lists] - Top k attractions for each user, in the same order as users_weights
+        """
+
+        user_vectors = self.normalized_user_vectors(users_weights)
+        if exclude is None:
+            exclude = [()] * len(user_vectors)
+        elif len(exclude) != len(user_vectors):
+            raise ValueError(f'exclude should have one list per user, got {len(exclude)} for {len(user_vectors)} users')
+        excluded_positions = [[self.attraction_positions[attraction] for attraction in user_exclude
+                               if attraction in self.attraction_positions] for user_exclude in exclude]
+
+        if self.index is None:
+            similarity_matrix = user_vectors @ self.normalized_matrix.T
+            top_positions = [top_k_indices(similarity, k, excluded, ties = 'highest') for similarity, excluded
+                             in zip(similarity_matrix, excluded_positions)]
+        elif self.index_type == 'balltree':
+            top_positions = [self._balltree_search(user_vector, k, excluded) for user_vector, excluded
+                             in zip(user_vectors, excluded_positions)]
+        else:
+            top_positions = [self.index.search(user_vector, k, excluded) for user_vector, excluded
+                             in zip(user_vectors, excluded_positions)]
+
+        return [self.attractions[positions].tolist() for positions in top_positions]
+
+    def recommend_scored(self, user_weights = defaultdict(int), k = 3, exclude = None):
+        """
+        Same as recommend, along with the cosine similarity of every recommended attraction.
+
+        Output: Recommendations [List of tuples] - (attraction, similarity) of the top k attractions, in descending order
+        """
+
+        similarity = self.scores([user_weights])[0]
+        excluded = [self.attraction_positions[attraction] for attraction in (exclude or ())
+                    if attraction in self.attraction_positions]
+        positions = top_k_indices(similarity, k, excluded, ties = 'highest')
+        return list(zip(self.attractions[positions].tolist(), similarity[positions].tolist()))
+
+    def normalized_user_vectors(self, users_weights):
+        """
+        L2 normalized user vectors, in the precision of the attraction matrix.
+        """
+
+        return _l2_normalize(self.user_vectors(users_weights)).astype(self.normalized_matrix.dtype)
+
+    def scores(self, users_weights):
+        """
+        Cosine similarity between every user (rows) & every attraction (columns).
+        """
+
+        return self.normalized_user_vectors(users_weights) @ self.normalized_matrix.T
+
+    def _balltree_search(self, user_vector, k, excluded):
+        """
+        Exact top 'k' using the BallTree, querying extra neighbours to make up for the excluded attractions.
+        """
+
+        if k <= 0:
+            return np.array([], dtype = int)
+
+        n_neighbours = min(k + len(excluded), len(self.attractions))
+        positions = self.index.query(user_vector.reshape(1, -1), k = n_neighbours)[1][0]
+        if excluded:
+            positions = positions[~np.isin(positions, excluded)]
+        return positions[:k]
+
+class ClusteredIndex:
+    """
+    Simple inverted file (IVF) index for maximum inner product search over L2 normalized vectors, built in NumPy.
+    Vectors are grouped with spherical k-means; a query scores the centroids, then only the vectors of the
+    'n_probe' closest clusters. Higher n_probe trades speed for recall.
+
+    Input: normalized_matrix [2D Numpy array] - L2 normalized vectors, one per row
+           n_lists [int] - Number of clusters. Defaults to the square root of the # of vectors.
+           n_probe [int] - Number of clusters scored per query. Defaults to 8.
+           n_iter [int] - Number of k-means iterations. Defaults to 10.
+           training_size [int] - Number of vectors sampled to fit the clusters. Defaults to 256 per cluster.
+           random_state [int] - Seed for the k-means initialization & sampling. Defaults to 0.
+    """
+
+    def __init__(self, normalized_matrix, n_lists = None, n_probe = 8, n_iter = 10, training_size = None, random_state = 0):
+        n = len(normalized_matrix)
+        self.normalized_matrix = normalized_matrix
+        self.n_lists = min(n, n_lists or max(1, int(np.sqrt(n))))
+        self.n_probe = n_probe
+
+        rng = np.random.RandomState(random_state)
+        training_size = min(n, training_size or 256 * self.n_lists)
+        training = normalized_matrix[rng.choice(n, training_size, replace = False)]
+
+        centroids = training[rng.choice(training_size, self.n_lists, replace = False)]
+        for _ in range(n_iter):
+            assignments = self._assign(training, centroids)
+            sums = np.zeros_like(centroids, dtype = np.float64)
+            np.add.at(sums, assignments, training)
+            # Clusters left empty keep their previous centroid
+            non_empty = np.bincount(assignments, minlength = self.n_lists) > 0
+            centroids[non_empty] = _l2_normalize(sums[non_empty]).astype(centroids.dtype)
+        self.centroids = centroids
+
+        assignments = self._assign(normalized_matrix, centroids)
+        # Positions sorted by cluster (ascending position within a cluster), with the start of each cluster in list_offsets
+        self.list_positions = np.argsort(assignments, kind = 'stable')
+        self.list_offsets = np.searchsorted(assignments[self.list_positions], np.arange(self.n_lists + 1))
+
+    @staticmethod
+    def _assign(matrix, centroids, chunk_size = 100000):
+        """
+        Closest centroid of every row, computed in chunks to bound memory.
+        """
+
+        return np.concatenate([np.argmax(matrix[start:start + chunk_size] @ centroids.T, axis = 1)
+                               for start in range(0, len(matrix), chunk_size)])
+
+    def search(self, query, k, excluded = ()):
+        """
+        Approximate top 'k' positions for a normalized query vector, in descending order of score.
+        """
+
+        n_probe = min(self.n_probe, self.n_lists)
+        clusters = np.argpartition(-(self.centroids @ query), n_probe - 1)[:n_probe]
+        candidates = np.sort(np.concatenate([self.list_positions[self.list_offsets[c]:self.list_offsets[c + 1]]
+                                             for c in clusters]))
+
+        excluded_candidates = np.flatnonzero(np.isin(candidates, excluded)) if len(excluded) else ()
+        top = top_k_indices(self.normalized_matrix[candidates] @ query, k, excluded_candidates, ties = 'highest')
+        return candidates[top]
+
+def _l2_normalize(matrix):
+    """
+    Divides every row by its L2 norm; rows with a norm of 0 are left as is, same as sklearn's cosine_similarity.
+    """
+
+    norms = np.linalg.norm(matrix, axis = 1, keepdims = True)
+    norms[norms == 0] = 1
+    return matrix / norms
+
+@dataclass
+class CrossValidationResult:
+    """
+    Outcome of classification_cv. Fold level scores & timings are kept in 'fold_scores' (one row per fold),
+    while the fitted model and validation data/predictions come from the last of the folds.
+    """
+
+    model: object
+    X_val: object
+    y_val: object
+    y_pred: object
+    y_pred_proba: object
+    fold_scores: pd.DataFrame
+
+    @property
+    def mean_scores(self):
+        """
+        Mean of every score & timing across the folds.
+        """
+
+        return self.fold_scores.mean()
+
+    def classification_report(self):
+        return classification_report(self.y_val, self.y_pred)
+
+    def to_dict(self):
+        """
+        Same dictionary as returned by classification_common_model.
+        """
+
+        mean_scores = self.mean_scores
+        return {'model': self.model, 'X_val': self.X_val, 'y_pred_proba': self.y_pred_proba,
+                'mean_train': mean_scores['train_accuracy'], 'mean_val': mean_scores['val_accuracy'],
+                'precision': mean_scores['precision'], 'recall': mean_scores['recall'],
+                'roc_auc': mean_scores['roc_auc'], 'logloss': mean_scores['logloss'],
+                'classification_report': self.classification_report()}
+
+def classification_cv(X_train_val, y_train_val, model, oversampler = None, scaler = None, threshold = 0.5, n_jobs = 1):
+    """
+    Does a kfold=5 split, scales & oversamples the data if requested & fits the transformed data on the model specified.
+    Every fold works on its own clones of the model, oversampler & scaler, so the folds can run in parallel.
+
+    Inputs:
+    X_train_val: Features to be used
+    Y_train_val: Target variable
+    model: Classification model to be used (left unfitted; fitted clones are used instead)
+    oversampler: Oversampling technique, None for no oversampling
+    scalar: Scaling method to be used, None for no scaling
+    threshold: probability point at which prediction should be put into a specific class
+    n_jobs: Number of folds run in parallel with joblib processes (-1 uses all the cores). Defaults to 1 i.e. serially.
+
+    Outputs:
+    CrossValidationResult with the per fold scores & timings, and the model, validation data & predictions of the last fold
+    """
+
+    #use stratified kfold to splice up train-val into train and val
+    skfold = StratifiedKFold(n_splits=5, shuffle = True, random_state=42)
+
+    folds = Parallel(n_jobs = n_jobs)(
+        delayed(_fit_and_score_fold)(X_train_val, y_train_val, train, val, clone(model),
+                                     clone(oversampler) if oversampler else None,
+                                     clone(scaler) if scaler else None, threshold)
+        for train, val in skfold.split(X_train_val, y_train_val))
+
+    fold_scores = pd.DataFrame([fold['scores'] for fold in folds]).rename_axis('fold')
+    last_fold = folds[-1]
+
+    return CrossValidationResult(model = last_fold['model'], X_val = last_fold['X_val'], y_val = last_fold['y_val'],
+                                 y_pred = last_fold['y_pred'], y_pred_proba = last_fold['y_pred_proba'],
+                                 fold_scores = fold_scores)
+
+def _fit_and_score_fold(X_train_val, y_train_val, train, val, model, oversampler, scaler, threshold):
+    """
+    Oversamples, scales, fits & scores a single fold. Returns the fold's scores & timings along with the fitted model,
+    validation data & predictions.
+    """
+
+    start = time.perf_counter()
+
+    #set up train and val for each fold
+    X_train, X_val = X_train_val.iloc[train], X_train_val.iloc[val]
+    y_train, y_val = y_train_val.iloc[train], y_train_val.iloc[val]
+
+    #oversample train data
+    if oversampler:
+        X_train, y_train = oversampler.fit_resample(X_train, y_train)
+
+    #Scale data
+    if scaler:
+        X_train = scaler.fit_transform(X_train)
+        X_val = scaler.transform(X_val)
+
+    #fit model
+    model.fit(X_train, y_train)
+    fit_time = time.perf_counter() - start
+
+    #make prediction using y-val
+    #try-except used incase model.predict_proba throws an error
+    try:
+        y_pred_proba = model.predict_proba(X_val)[:,1]
+        y_pred = y_pred_proba > threshold
+    except Exception:
+        y_pred_proba = np.zeros(len(y_val))
+        y_pred = model.predict(X_val)
+
+    scores = {'train_accuracy': accuracy_score(y_train, model.predict(X_train)),
+              'val_accuracy': accuracy_score(y_val, y_pred),
+              'precision': precision_score(y_val, y_pred, average='binary'),
+              'recall': recall_score(y_val, y_pred, average='binary'),
+              'roc_auc': roc_auc_score(y_val, y_pred_proba),
+              'logloss': log_loss(y_val, y_pred_proba),
+              'fit_time': fit_time,
+              'score_time': time.perf_counter() - start - fit_time}
+
+    return {'scores': scores, 'model': model, 'X_val': X_val, 'y_val': y_val, 'y_pred': y_pred, 'y_pred_proba': y_pred_proba}
+
 def classification_common_model (X_train_val, y_train_val, model, oversampler = RandomOverSampler(), scaler = StandardScaler(), \
-                          threshold = 0.5, return_type = None):
+                          threshold = 0.5, return_type = None, n_jobs = 1):
     
     """
     Function does a kfold=5 split, scales & oversamples the data if requested, 
     fits the transformed data on the model specified & prints the average of the 5-Fold along various metrics.
+    The folds are run by classification_cv, on clones of the model, oversampler & scaler.
     
     Inputs:
     X_train_val: Features to be used
@@ -67,6 +430,7 @@ def classification_common_model (X_train_val, y_train_val, model, oversampler =
     scalar: Scaling method to be used
     threshold: probability point at which prediction should be put into a specific class
     return_type: If the function should return a dictionary with all values; the scores only get printed.
+    n_jobs: Number of folds run in parallel (-1 uses all the cores). Defaults to 1 i.e. serially.
     
     Outputs:
     Using data from the last of the 5 KFolds, returns a dictionary containing the fitted model, data used for validation,
@@ -75,78 +439,22 @@ def classification_common_model (X_train_val, y_train_val, model, oversampler =
     
     """
     
-    #use stratified kfold to splice up train-val into train and val
-    
-    skfold = StratifiedKFold(n_splits=5, shuffle = True, random_state=42)
-    skfold.get_n_splits(X_train_val, y_train_val)
-    
-    #create a list to store our scores
-    train_scores= []
-    val_scores= []
-    precision_scores= []
-    recall_scores= []
-    roc_auc_scores = []
-    logloss_scores = []
-    
-    #fit and score model on each fold
-    for train, val in skfold.split(X_train_val, y_train_val):
-        
-        #set up train and val for each fold
-        X_train, X_val = X_train_val.iloc[train], X_train_val.iloc[val]
-        y_train, y_val = y_train_val.iloc[train], y_train_val.iloc[val]
-        
-        #oversample train data
-        if oversampler:
-            X_train, y_train = oversampler.fit_sample(X_train, y_train)
-
-        #Scale data
-        if scaler:
-            X_train = scaler.fit_transform(X_train)
-            X_val = scaler.transform(X_val)
-                
-        #fit model
-        model.fit(X_train, y_train)
-        
-        #make prediction using y-val
-        #try-except used incase model.predict_proba throws an error
-        try:
-            y_pred_proba = model.predict_proba(X_val)[:,1]
-            y_pred = y_pred_proba > threshold
-        except:
-            y_pred_proba = np.zeros(len(y_val))
-            y_pred = model.predict(X_val)
-        
-        #append scores onto list
-        train_scores.append(accuracy_score(y_train,  model.predict(X_train)))
-        val_scores.append(accuracy_score(y_val, y_pred))
-        precision_scores.append(precision_score(y_val, y_pred, average='binary'))
-        recall_scores.append(recall_score(y_val, y_pred, average='binary'))
-        roc_auc_scores.append(roc_auc_score(y_val, y_pred_proba))
-        logloss_scores.append(log_loss(y_val, y_pred_proba))
-        
-    #find the means for our scores
-    mean_train = np.mean(train_scores)
-    mean_val = np.mean(val_scores)
-    precision = np.mean(precision_scores)
-    recall = np.mean(recall_scores)
-    roc_auc = np.mean(roc_auc_scores)
-    logloss = np.mean(logloss_scores)
+    result = classification_cv(X_train_val, y_train_val, model, oversampler, scaler, threshold, n_jobs)
+    result_dict = result.to_dict()
     
     #print our mean accuracy score, our train/test ratio precision, and recall
     print(f'Scores fit on {model}')
-    print(f'Accuracy: {mean_val:.2f}')
-    print(f'Train/Test ratio: {(mean_train)/(mean_val):.2f}')
+    print(f"Accuracy: {result_dict['mean_val']:.2f}")
+    print(f"Train/Test ratio: {(result_dict['mean_train'])/(result_dict['mean_val']):.2f}")
     
-    print(f'Precision: {precision:.2f}')
-    print(f'RECALL: {recall:.2f}')
-    print(f'Log Loss: {logloss:.2f}')
-    print(f'ROC AUC: {roc_auc:.2f}')
-    print(classification_report(y_val,y_pred))
+    print(f"Precision: {result_dict['precision']:.2f}")
+    print(f"RECALL: {result_dict['recall']:.2f}")
+    print(f"Log Loss: {result_dict['logloss']:.2f}")
+    print(f"ROC AUC: {result_dict['roc_auc']:.2f}")
+    print(result_dict['classification_report'])
     print('-----')      
     
     if return_type:
-        return {'model':model, 'X_val':X_val, 'y_pred_proba':y_pred_proba, 'mean_train':mean_train, \
-                'mean_val': mean_val, 'precision':precision, 'recall':recall, 'roc_auc':roc_auc, \
-                'logloss':logloss, 'classification_report': classification_report(y_val,y_pred) }
+        return result_dict
     else:
         return None
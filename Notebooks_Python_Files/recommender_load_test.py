@@ -0,0 +1,99 @@
+"""
+Local load generator for the recommender service (recommender_service.py).
+
+Sends requests with random priorities from several concurrent clients for a fixed duration,
+then reports the p50/p99 latency & the number of requests per second.
+
+To run, start the service & enter: python recommender_load_test.py --url http://127.0.0.1:8000 --clients 8 --seconds 10
+"""
+
+import argparse
+import json
+import random
+import threading
+import time
+import urllib.request
+
+import numpy as np
+
+def send_request(url, payload):
+    """
+    Posts the JSON payload & returns the decoded JSON response.
+    """
+
+    request = urllib.request.Request(url, data = json.dumps(payload).encode('utf-8'),
+                                     headers = {'Content-Type': 'application/json'})
+    with urllib.request.urlopen(request) as response:
+        return json.loads(response.read())
+
+def run_load_test(base_url = 'http://127.0.0.1:8000', clients = 8, seconds = 10, batch_size = 0, seed = 0):
+    """
+    Runs the load test & returns a dictionary of the results.
+
+    Args:
+        base_url (str, optional): Url of the running service. Defaults to 'http://127.0.0.1:8000'.
+        clients (int, optional): Number of concurrent clients, each sending one request at a time. Defaults to 8.
+        seconds (float, optional): Duration of the test. Defaults to 10.
+        batch_size (int, optional): If above 0, the batch endpoint is called with this many users per request. Defaults to 0.
+        seed (int, optional): Seed for the random priorities. Defaults to 0.
+    """
+
+    with urllib.request.urlopen(base_url + '/health') as response:
+        json.loads(response.read())
+    options = ['Breathtaking Views', 'Must Visits', 'Panaromic Photography', 'Strenuous Hikes', 'Easy Trails',
+               'Gorgeous Sunsets', 'Stunning Waterfalls', 'Serene Lakes', 'Wildlife', 'Stargazing', 'Shuttle Bus',
+               'Organized Tours']
+
+    latencies = []
+    errors = []
+    lock = threading.Lock()
+    end_time = time.perf_counter() + seconds
+
+    def client(client_id):
+        rng = random.Random(seed + client_id)
+        client_latencies = []
+        client_errors = 0
+        while time.perf_counter() < end_time:
+            users = [{priority: 1 for priority in rng.sample(options, 3)} for _ in range(max(batch_size, 1))]
+            if batch_size:
+                url, payload = base_url + '/recommend/batch', {'users': users}
+            else:
+                url, payload = base_url + '/recommend', {'weights': users[0]}
+
+            start = time.perf_counter()
+            try:
+                send_request(url, payload)
+                client_latencies.append(time.perf_counter() - start)
+            except OSError:
+                client_errors += 1
+
+        with lock:
+            latencies.extend(client_latencies)
+            errors.append(client_errors)
+
+    threads = [threading.Thread(target = client, args = (client_id,)) for client_id in range(clients)]
+    start = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - start
+
+    latencies_ms = 1000 * np.array(latencies)
+    return {'requests': len(latencies), 'errors': sum(errors),
+            'requests_per_second': len(latencies) / elapsed,
+            'users_per_second': len(latencies) * max(batch_size, 1) / elapsed,
+            'p50_ms': float(np.percentile(latencies_ms, 50)) if len(latencies) else None,
+            'p99_ms': float(np.percentile(latencies_ms, 99)) if len(latencies) else None}
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description = 'Load test the recommender service')
+    parser.add_argument('--url', default = 'http://127.0.0.1:8000')
+    parser.add_argument('--clients', type = int, default = 8)
+    parser.add_argument('--seconds', type = float, default = 10)
+    parser.add_argument('--batch-size', type = int, default = 0, help = 'Users per request on the batch endpoint; 0 uses the single query endpoint')
+    arguments = parser.parse_args()
+
+    results = run_load_test(arguments.url, arguments.clients, arguments.seconds, arguments.batch_size)
+    for key, value in results.items():
+        print(f'{key}: {value}')
@@ -0,0 +1,151 @@
+"""
+Standalone HTTP service for the attractions recommender, built on the python standard library.
+
+The topic-score matrix is loaded into an AttractionRecommender once at startup. Endpoints:
+    POST /recommend        {"weights": {"Must Visits": 1, ...}, "k": 3, "exclude": [...]} -> {"attractions": [...]}
+    POST /recommend/batch  {"users": [{"Must Visits": 1, ...}, ...], "k": 3}              -> {"attractions": [[...], ...]}
+    GET  /metrics          request counts, throughput & latency histograms per endpoint
+    GET  /health
+
+To run the service, cd into this directory & enter: python recommender_service.py --port 8000
+"""
+
+import argparse
+import bisect
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from recommender_and_other_functions import AttractionRecommender
+
+# Endpoints with their own metrics; requests to any other path are recorded together under 'other'
+ENDPOINTS = {'/recommend', '/recommend/batch', '/metrics', '/health'}
+
+# Upper bounds (in milliseconds) of the latency histogram buckets; the last bucket collects everything slower
+LATENCY_BUCKETS_MS = [0.1, 0.25, 0.5, 1, 2.5, 5, 10, 25, 50, 100, 250, 500, 1000]
+
+class ServiceMetrics:
+    """
+    Thread safe request counters & latency histograms, kept per endpoint.
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.start_time = time.monotonic()
+        self.endpoints = {}
+
+    def record(self, endpoint, latency_ms, n_users = 0, error = False):
+        """
+        Records a single request on the endpoint, along with the number of users it scored.
+        """
+
+        with self.lock:
+            metrics = self.endpoints.setdefault(endpoint, {'requests': 0, 'errors': 0, 'users_scored': 0,
+                                                           'latency_sum_ms': 0.0,
+                                                           'latency_histogram': [0] * (len(LATENCY_BUCKETS_MS) + 1)})
+            metrics['requests'] += 1
+            metrics['errors'] += int(error)
+            metrics['users_scored'] += n_users
+            metrics['latency_sum_ms'] += latency_ms
+            metrics['latency_histogram'][bisect.bisect_left(LATENCY_BUCKETS_MS, latency_ms)] += 1
+
+    def summary(self):
+        """
+        Returns the metrics as a JSON serializable dictionary, including requests & users per second since startup.
+        """
+
+        with self.lock:
+            uptime = time.monotonic() - self.start_time
+            endpoints = {}
+            for endpoint, metrics in self.endpoints.items():
+                endpoints[endpoint] = dict(metrics,
+                                           latency_histogram = dict(zip([f'le_{bound}ms' for bound in LATENCY_BUCKETS_MS] + ['inf'],
+                                                                        metrics['latency_histogram'])),
+                                           mean_latency_ms = metrics['latency_sum_ms'] / metrics['requests'],
+                                           requests_per_second = metrics['requests'] / uptime,
+                                           users_per_second = metrics['users_scored'] / uptime)
+            return {'uptime_seconds': uptime, 'endpoints': endpoints}
+
+def make_handler(recommender, metrics):
+    """
+    Creates the request handler class serving the provided recommender & recording into metrics.
+    """
+
+    class RecommenderRequestHandler(BaseHTTPRequestHandler):
+
+        def do_GET(self):
+            start = time.perf_counter()
+            if self.path == '/health':
+                status, response = 200, {'status': 'ok', 'attractions': len(recommender.attractions)}
+            elif self.path == '/metrics':
+                status, response = 200, metrics.summary()
+            else:
+                status, response = 404, {'error': f'unknown path {self.path}'}
+
+            self._send_json(status, response)
+            metrics.record(self._endpoint(), 1000 * (time.perf_counter() - start), error = status != 200)
+
+        def do_POST(self):
+            start = time.perf_counter()
+            n_users = 0
+            status = 200
+            try:
+                body = json.loads(self.rfile.read(int(self.headers.get('Content-Length', 0))) or b'{}')
+                k = int(body.get('k', 3))
+                if self.path == '/recommend':
+                    n_users = 1
+                    response = {'attractions': recommender.recommend(body.get('weights', {}), k, body.get('exclude'))}
+                elif self.path == '/recommend/batch':
+                    users = body.get('users', [])
+                    n_users = len(users)
+                    response = {'attractions': recommender.recommend_batch(users, k, body.get('exclude'))}
+                else:
+                    status, response = 404, {'error': f'unknown path {self.path}'}
+            except (ValueError, TypeError, AttributeError, KeyError) as err_message:
+                status, response = 400, {'error': str(err_message)}
+
+            self._send_json(status, response)
+            metrics.record(self._endpoint(), 1000 * (time.perf_counter() - start), n_users, error = status != 200)
+
+        def _endpoint(self):
+            # Arbitrary paths (typos, scanners, query strings) would otherwise each add an entry to the metrics
+            return self.path if self.path in ENDPOINTS else 'other'
+
+        def _send_json(self, status, payload):
+            content = json.dumps(payload).encode('utf-8')
+            self.send_response(status)
+            self.send_header('Content-Type', 'application/json')
+            self.send_header('Content-Length', str(len(content)))
+            self.end_headers()
+            self.wfile.write(content)
+
+        def log_message(self, format, *args):
+            # Per request logging would dominate the latency; the metrics endpoint is used instead
+            pass
+
+    return RecommenderRequestHandler
+
+def make_server(host = '127.0.0.1', port = 8000, path = "../Data/Attractions_Topics_Summary_Scores.csv"):
+    """
+    Loads the recommender once & returns the (not yet started) HTTP server along with its metrics.
+    """
+
+    recommender = AttractionRecommender.from_csv(path)
+    metrics = ServiceMetrics()
+    server = ThreadingHTTPServer((host, port), make_handler(recommender, metrics))
+    return server, metrics
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description = 'Serve the attractions recommender over HTTP')
+    parser.add_argument('--host', default = '127.0.0.1')
+    parser.add_argument('--port', type = int, default = 8000)
+    parser.add_argument('--data', default = "../Data/Attractions_Topics_Summary_Scores.csv")
+    arguments = parser.parse_args()
+
+    server, _ = make_server(arguments.host, arguments.port, arguments.data)
+    print(f'Serving recommendations on http://{arguments.host}:{arguments.port}')
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        server.server_close()
@@ -0,0 +1,147 @@
+"""
+This python module fetches Trip Advisor pages concurrently, for use by the scraping module.
+
+All requests go through one pooled requests Session, with a limit on the number of concurrent requests,
+a per-host rate limit, timeouts and retries with exponential backoff.
+The base url can be pointed to a local HTTP server (e.g. 'python -m http.server' in a folder of saved html pages)
+to run the scraper offline against stored fixtures.
+"""
+
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache
+from urllib.parse import urlsplit
+
+import requests
+from requests.adapters import HTTPAdapter
+
+TRIP_ADVISOR_URL = "https://www.tripadvisor.in"
+
+# Responses worth retrying; any other non 200 status is returned as a failure straight away
+RETRY_STATUS_CODES = {429, 500, 502, 503, 504}
+
+class HostRateLimiter:
+    """
+    Thread safe rate limiter, spacing out the requests made to each host by at least 1/requests_per_second seconds.
+
+    Args:
+        requests_per_second (float): Maximum request rate per host. None or 0 turns off the rate limit.
+    """
+
+    def __init__(self, requests_per_second = None):
+        self.interval = 1 / requests_per_second if requests_per_second else 0
+        self.next_slot = {}
+        self.lock = threading.Lock()
+
+    def wait(self, host):
+        """
+        Blocks until a request to the host is allowed.
+        """
+
+        if not self.interval:
+            return
+
+        with self.lock:
+            now = time.monotonic()
+            slot = max(now, self.next_slot.get(host, now))
+            self.next_slot[host] = slot + self.interval
+
+        if slot > now:
+            time.sleep(slot - now)
+
+class ReviewFetcher:
+    """
+    Fetches Trip Advisor pages concurrently over a pooled session.
+
+    Args:
+        base_url (str, optional): Prefix for the relative page urls. Defaults to TRIP_ADVISOR_URL.
+        max_workers (int, optional): Maximum number of concurrent requests. Defaults to 8.
+        requests_per_second (float, optional): Maximum request rate per host. Defaults to 4.
+        timeout (float, optional): Connect & read timeout in seconds for each request. Defaults to 10.
+        retries (int, optional): Number of retries after a failed request. Defaults to 3.
+        backoff_factor (float, optional): Retry number 'i' waits backoff_factor * 2**i seconds. Defaults to 0.5.
+        session (requests.Session, optional): Session to be used. Defaults to a new session sized for max_workers.
+    """
+
+    def __init__(self, base_url = TRIP_ADVISOR_URL, max_workers = 8, requests_per_second = 4, timeout = 10,
+                 retries = 3, backoff_factor = 0.5, session = None):
+        self.base_url = base_url
+        self.max_workers = max_workers
+        self.timeout = timeout
+        self.retries = retries
+        self.backoff_factor = backoff_factor
+        self.rate_limiter = HostRateLimiter(requests_per_second)
+
+        if session is None:
+            session = requests.Session()
+            adapter = HTTPAdapter(pool_connections = max_workers, pool_maxsize = max_workers)
+            session.mount('http://', adapter)
+            session.mount('https://', adapter)
+        self.session = session
+
+    def fetch(self, page_url):
+        """
+        Fetches a single page, retrying on connection errors, timeouts & server errors.
+
+        Args:
+            page_url (str): url relative to base_url (e.g. a review link), or an absolute url
+
+        Returns:
+            [str]: Page html; None if the page could not be retrieved
+        """
+
+        url = page_url if page_url.startswith('http') else self.base_url + page_url
+        host = urlsplit(url).netloc
+
+        for attempt in range(self.retries + 1):
+            if attempt:
+                time.sleep(self.backoff_factor * 2 ** (attempt - 1))
+
+            self.rate_limiter.wait(host)
+            try:
+                response = self.session.get(url, timeout = self.timeout)
+            except requests.RequestException:
+                continue
+
+            if response.status_code == 200:
+                return response.text
+            if response.status_code not in RETRY_STATUS_CODES:
+                return None
+
+        return None
+
+    def fetch_many(self, page_urls, parse = None):
+        """
+        Fetches the pages concurrently, with at most max_workers requests in flight.
+
+        Args:
+            page_urls (list of str): Page urls, see fetch()
+            parse (function, optional): Applied to each fetched html inside the worker. Defaults to None.
+
+        Returns:
+            [list]: html (or parsed output) of each page, in the same order as page_urls. None for pages whose
+                    fetch or parse failed in any way.
+        """
+
+        def fetch_and_parse(page_url):
+            # Any failure (including an invalid url) only loses this page, instead of failing the whole batch
+            try:
+                html = self.fetch(page_url)
+                return parse(html) if (html is not None and parse is not None) else html
+            except Exception:
+                return None
+
+        with ThreadPoolExecutor(max_workers = self.max_workers) as executor:
+            return list(executor.map(fetch_and_parse, page_urls))
+
+    def close(self):
+        self.session.close()
+
+@lru_cache(maxsize = None)
+def default_fetcher():
+    """
+    Returns a ReviewFetcher with the default settings, shared across calls so its connection pool is reused.
+    """
+
+    return ReviewFetcher()
@@ -0,0 +1,248 @@
+"""
+This python module stores reviews column by column as NumPy files, as a compact & partially readable alternative
+to pickled / csv DataFrames.
+
+Every column is saved in a folder as its own .npy file, memory-mapped when read:
+    category - repeated strings (attraction_name, user_name, ...) as int32 codes & a dictionary of the distinct values,
+               kept in its own json file that is only loaded when the column is read or filtered
+    date     - Trip Advisor dates such as 'Nov 2020' as datetime64[M] (unparseable dates become NaT)
+    numeric  - numbers, in their own dtype
+    text     - free text (review_text, review_title, links) as one utf-8 buffer & the offsets of every row
+
+Reads only touch the columns that are asked for & the columns used in the filters; filters are evaluated on the codes /
+dates / numbers directly and only the matching rows of the requested columns are decoded, e.g.
+
+    store = ColumnarReviewStore('../Data/reviews_store')
+    store.read(['review_text'], filters = [('attraction_name', '==', 'Glacier Point'), ('review_date', '>=', '2018')])
+"""
+
+import json
+import operator
+import os
+
+import numpy as np
+import pandas as pd
+
+SCHEMA_FILE = 'schema.json'
+
+DATE_COLUMNS = ['review_date', 'experience_date']
+TEXT_COLUMNS = ['review_text', 'review_title', 'review_link', 'text']
+
+# String columns with at most this many distinct values per row are dictionary encoded, the others are stored as text.
+# Preprocessed review columns (review_lemma, ...) are nearly unique & would otherwise fill the dictionaries.
+CATEGORY_MAX_UNIQUE_RATIO = 0.5
+
+FILTER_OPERATORS = {'==': operator.eq, '!=': operator.ne, '<': operator.lt, '<=': operator.le,
+                    '>': operator.gt, '>=': operator.ge}
+
+class ColumnarReviewStore:
+    """
+    Read access to a review store folder written by ColumnarReviewStore.write.
+
+    Args:
+        directory (str): Folder of the store
+    """
+
+    def __init__(self, directory):
+        self.directory = directory
+        with open(os.path.join(directory, SCHEMA_FILE)) as schema_file:
+            schema = json.load(schema_file)
+        self.n_rows = schema['n_rows']
+        self.schema = {column['name']: column for column in schema['columns']}
+        self.arrays = {}
+        self.categories = {}
+
+    @classmethod
+    def write(cls, directory, df_reviews, category_columns = None, date_columns = None, text_columns = None):
+        """
+        Writes the reviews to the folder (replacing a store already in it) & returns the opened store.
+
+        Args:
+            directory (str): Folder of the store, created if needed
+            df_reviews (pd.DataFrame): Reviews, e.g. as scraped or preprocessed
+            category_columns (list, optional): Columns dictionary encoded. Defaults to the string columns that are not
+                                               text columns & have few distinct values (see CATEGORY_MAX_UNIQUE_RATIO).
+            date_columns (list, optional): Columns stored as months. Defaults to DATE_COLUMNS & datetime columns.
+            text_columns (list, optional): Columns stored as utf-8 text. Defaults to TEXT_COLUMNS.
+        """
+
+        os.makedirs(directory, exist_ok = True)
+        date_columns = set(date_columns if date_columns is not None else
+                           [column for column in df_reviews if column in DATE_COLUMNS or
+                            pd.api.types.is_datetime64_any_dtype(df_reviews[column])])
+        text_columns = set(text_columns if text_columns is not None else TEXT_COLUMNS)
+
+        columns = []
+        for name in df_reviews:
+            values = df_reviews[name]
+            if name in date_columns:
+                kind = 'date'
+            elif category_columns is not None:
+                kind = 'category' if name in category_columns else ('numeric' if _is_numeric(values) else 'text')
+            elif _is_numeric(values):
+                kind = 'numeric'
+            elif name in text_columns or values.nunique() > CATEGORY_MAX_UNIQUE_RATIO * max(len(values), 1):
+                kind = 'text'
+            else:
+                kind = 'category'
+
+            columns.append(_WRITERS[kind](directory, name, values))
+
+        with open(os.path.join(directory, SCHEMA_FILE), 'w') as schema_file:
+            json.dump({'n_rows': len(df_reviews), 'columns': columns}, schema_file, indent = 2)
+
+        return cls(directory)
+
+    @property
+    def columns(self):
+        return list(self.schema)
+
+    def __len__(self):
+        return self.n_rows
+
+    def read(self, columns = None, filters = None):
+        """
+        Reads the requested columns of the rows matching every filter.
+
+        Args:
+            columns (list, optional): Columns to be read. Defaults to all the columns.
+            filters (list of tuples, optional): (column, operator, value) conditions that all have to hold, with
+                operator one of ==, !=, <, <=, >, >= & in. Dates are compared by month, e.g. ('review_date', '>=', '2018').
+                Defaults to None (all rows).
+
+        Returns:
+            [pd.DataFrame]: Category columns as pandas categoricals, date columns as datetime64, in the original row order
+        """
+
+        columns = self.columns if columns is None else list(columns)
+        rows = self.filter_rows(filters) if filters else None
+
+        return pd.DataFrame({column: self._read_column(column, rows) for column in columns},
+                            index = rows if rows is not None else pd.RangeIndex(self.n_rows), columns = columns)
+
+    def filter_rows(self, filters):
+        """
+        Positions of the rows matching every (column, operator, value) filter.
+        """
+
+        mask = np.ones(self.n_rows, dtype = bool)
+        for column, operator_name, value in filters:
+            mask &= self._filter_mask(column, operator_name, value)
+        return np.flatnonzero(mask)
+
+    def _filter_mask(self, column, operator_name, value):
+        kind = self.schema[column]['kind']
+
+        def compare(array, value):
+            if operator_name == 'in':
+                return np.isin(array, list(value))
+            return FILTER_OPERATORS[operator_name](array, value)
+
+        if kind == 'category':
+            # The condition is evaluated once per distinct value, then looked up for every row through its code.
+            # Missing values (code -1) never match, hence the trailing False.
+            categories = np.array(self._categories(column) + [None], dtype = object)
+            matches = np.zeros(len(categories), dtype = bool)
+            matches[:-1] = compare(categories[:-1], value)
+            return matches[self._array(column)]
+        if kind == 'date':
+            value = [_to_month(item) for item in value] if operator_name == 'in' else _to_month(value)
+            return compare(self._array(column), value)
+        if kind == 'numeric':
+            return compare(self._array(column), value)
+        return compare(np.array(self._read_text(column, None), dtype = object), value)
+
+    def _read_column(self, column, rows):
+        kind = self.schema[column]['kind']
+        if kind == 'text':
+            return self._read_text(column, rows)
+
+        array = self._array(column)
+        array = array[rows] if rows is not None else np.asarray(array)
+        if kind == 'category':
+            return pd.Categorical.from_codes(array, self._categories(column))
+        if kind == 'date':
+            return array.astype('datetime64[ns]')
+        return array
+
+    def _read_text(self, column, rows):
+        offsets = self._array(column + '.offsets')
+        rows = np.arange(self.n_rows) if rows is None else rows
+        starts = offsets[rows].tolist()
+        ends = offsets[rows + 1].tolist()
+        missing = self._array(column + '.missing')[rows].tolist()
+
+        # Slicing a memoryview of the mapped buffer only reads the pages holding the requested rows
+        buffer = memoryview(self._array(column + '.utf8'))
+        return [None if is_missing else str(buffer[start:end], 'utf-8')
+                for start, end, is_missing in zip(starts, ends, missing)]
+
+    def _array(self, name):
+        """
+        Memory-maps the .npy file once & keeps it for later reads.
+        """
+
+        if name not in self.arrays:
+            self.arrays[name] = _load(os.path.join(self.directory, name + '.npy'))
+        return self.arrays[name]
+
+    def _categories(self, column):
+        """
+        Loads the dictionary of a category column once & keeps it for later reads.
+        """
+
+        if column not in self.categories:
+            with open(os.path.join(self.directory, column + '.categories.json'), encoding = 'utf-8') as categories_file:
+                self.categories[column] = json.load(categories_file)
+        return self.categories[column]
+
+def _is_numeric(values):
+    return pd.api.types.is_numeric_dtype(values) and not pd.api.types.is_bool_dtype(values)
+
+def _write_category(directory, name, values):
+    # Everything but the missing values is stored as strings, so that mixed types can be sorted & saved as json
+    values = values.where(values.isna(), values.astype(str))
+    codes, categories = pd.factorize(values, sort = True)
+    np.save(os.path.join(directory, name + '.npy'), codes.astype(np.int32))
+    with open(os.path.join(directory, name + '.categories.json'), 'w', encoding = 'utf-8') as categories_file:
+        json.dump(categories.tolist(), categories_file, ensure_ascii = False)
+    return {'name': name, 'kind': 'category'}
+
+def _write_date(directory, name, values):
+    if not pd.api.types.is_datetime64_any_dtype(values):
+        values = pd.to_datetime(values, format = '%b %Y', errors = 'coerce')
+    np.save(os.path.join(directory, name + '.npy'), values.values.astype('datetime64[M]'))
+    return {'name': name, 'kind': 'date'}
+
+def _write_numeric(directory, name, values):
+    # Nullable pandas dtypes (e.g. Int64) are saved as floats, with NaN for the missing values
+    values = values.astype(float) if pd.api.types.is_extension_array_dtype(values) else values
+    np.save(os.path.join(directory, name + '.npy'), values.values)
+    return {'name': name, 'kind': 'numeric', 'dtype': str(values.dtype)}
+
+def _write_text(directory, name, values):
+    missing = values.isna().values
+    encoded = [b'' if is_missing else str(value).encode('utf-8') for value, is_missing in zip(values, missing)]
+    offsets = np.zeros(len(encoded) + 1, dtype = np.int64)
+    np.cumsum([len(value) for value in encoded], out = offsets[1:])
+
+    np.save(os.path.join(directory, name + '.utf8.npy'), np.frombuffer(b''.join(encoded), dtype = np.uint8))
+    np.save(os.path.join(directory, name + '.offsets.npy'), offsets)
+    np.save(os.path.join(directory, name + '.missing.npy'), missing)
+    return {'name': name, 'kind': 'text'}
+
+_WRITERS = {'category': _write_category, 'date': _write_date, 'numeric': _write_numeric, 'text': _write_text}
+
+def _to_month(value):
+    """
+    Converts a filter value ('2018', '2018-06', 'Jun 2018', a Timestamp...) into a datetime64[M].
+    """
+
+    return np.datetime64(pd.Timestamp(value).to_period('M').start_time, 'M')
+
+def _load(path):
+    # Empty arrays can't be memory-mapped
+    try:
+        return np.load(path, mmap_mode = 'r')
+    except ValueError:
+        return np.load(path)
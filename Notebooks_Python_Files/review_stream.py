@@ -0,0 +1,86 @@
+"""
+This python module writes scraped reviews to disk incrementally as JSON Lines, and reads them back in chunks.
+
+A crawl can then run in bounded memory: reviews from scraping.ta_attraction_reviews_stream are appended to the file
+as they come in & flushed periodically, and preprocessing reads the file back one DataFrame chunk at a time.
+"""
+
+import json
+import os
+
+import pandas as pd
+
+class JsonLinesReviewWriter:
+    """
+    Appends reviews (one JSON object per line) to a file, flushing to disk every 'flush_every' reviews.
+    Use as a context manager so the remaining reviews are flushed on exit.
+
+    Args:
+        path (str): Location of the JSON Lines file. Reviews are appended if the file already exists.
+        flush_every (int, optional): Number of reviews written between flushes. Defaults to 100.
+    """
+
+    def __init__(self, path, flush_every = 100):
+        self.path = path
+        self.flush_every = flush_every
+        self.file = open(path, 'a', encoding = 'utf-8')
+        self.n_written = 0
+
+    def write(self, review):
+        """
+        Writes a single review dictionary. Missing values (None/NaN) are written as null.
+        """
+
+        record = {key: (None if value != value else value) for key, value in review.items()}
+        self.file.write(json.dumps(record, ensure_ascii = False) + '\n')
+        self.n_written += 1
+
+        if self.n_written % self.flush_every == 0:
+            self.flush()
+
+    def write_all(self, reviews):
+        """
+        Writes every review of an iterable (e.g. a generator) & returns the number written.
+        """
+
+        n_before = self.n_written
+        for review in reviews:
+            self.write(review)
+        self.flush()
+        return self.n_written - n_before
+
+    def flush(self):
+        self.file.flush()
+        os.fsync(self.file.fileno())
+
+    def close(self):
+        if not self.file.closed:
+            self.flush()
+            self.file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+def read_reviews_chunks(path, chunksize = 10000, columns = None):
+    """
+    Reads a JSON Lines file of reviews back in DataFrame chunks.
+
+    Args:
+        path (str): Location of the JSON Lines file
+        chunksize (int, optional): Number of reviews per chunk. Defaults to 10000.
+        columns (list of str, optional): Only these columns are kept in every chunk. Defaults to all columns.
+
+    Returns:
+        Yields [pd.DataFrame] chunks of at most 'chunksize' reviews, in the order they were written
+    """
+
+    reader = pd.read_json(path, lines = True, chunksize = chunksize, dtype = False, convert_dates = False)
+    # The file is closed even if the caller stops before the last chunk
+    try:
+        for df_chunk in reader:
+            yield df_chunk if columns is None else df_chunk.reindex(columns = columns)
+    finally:
+        reader.close()
@@ -0,0 +1,139 @@
+"""
+This python module persists the progress of a Trip Advisor scrape in a local SQLite file.
+
+Scraped reviews are stored keyed by their review_link, so that an interrupted scrape can resume without fetching them
+again and a refresh only fetches new reviews. The listing pages of each attraction that were completely processed are recorded too.
+"""
+
+import sqlite3
+from datetime import datetime, timezone
+
+import pandas as pd
+
+DEFAULT_STORE_PATH = '../Data/scrape_checkpoint.sqlite'
+
+REVIEW_COLUMNS = ['attraction_name', 'attraction_id', 'user_name', 'user_profile_link', 'review_date', 'helpful_votes',
+                  'rating', 'review_link', 'review_text', 'review_title', 'experience_date']
+
+def review_month(review_date):
+    """
+    Converts a Trip Advisor review date such as 'Nov 2020' into a sortable 'YYYY-MM' string.
+
+    Args:
+        review_date (str): Review date as scraped by ta_attraction_reviews_parser
+
+    Returns:
+        [str]: 'YYYY-MM' month of the review; None if the date could not be parsed (e.g. 'Yesterday')
+    """
+
+    try:
+        return datetime.strptime(review_date, '%b %Y').strftime('%Y-%m')
+    except (TypeError, ValueError):
+        return None
+
+class ScrapeCheckpointStore:
+    """
+    SQLite backed store of scraped reviews & completed listing pages.
+
+    Args:
+        path (str, optional): Location of the SQLite file. Defaults to DEFAULT_STORE_PATH.
+    """
+
+    def __init__(self, path = DEFAULT_STORE_PATH):
+        self.path = path
+        self.connection = sqlite3.connect(path)
+        review_columns = ',\n'.join(f'{column} TEXT' for column in REVIEW_COLUMNS if column != 'review_link')
+        with self.connection:
+            self.connection.execute(f'''
+                CREATE TABLE IF NOT EXISTS reviews (
+                    review_link TEXT PRIMARY KEY,
+                    {review_columns},
+                    review_month TEXT,
+                    scraped_at TEXT
+                )''')
+            self.connection.execute('''
+                CREATE TABLE IF NOT EXISTS completed_pages (
+                    attraction_id TEXT,
+                    page_offset INTEGER,
+                    completed_at TEXT,
+                    PRIMARY KEY (attraction_id, page_offset)
+                )''')
+
+    def known_review_links(self, attraction_id = None):
+        """
+        Returns the set of review links already stored, optionally only for one attraction.
+        """
+
+        if attraction_id is None:
+            rows = self.connection.execute('SELECT review_link FROM reviews')
+        else:
+            rows = self.connection.execute('SELECT review_link FROM reviews WHERE attraction_id = ?', (attraction_id,))
+        return {row[0] for row in rows}
+
+    def completed_pages(self, attraction_id):
+        """
+        Returns the set of listing page offsets of the attraction that were completely scraped, which sets where a scrape resumes.
+        Offsets shift as new reviews are posted, so they are only a hint; the stored review links tell which reviews to skip.
+        """
+
+        rows = self.connection.execute('SELECT page_offset FROM completed_pages WHERE attraction_id = ?', (attraction_id,))
+        return {row[0] for row in rows}
+
+    def last_review_month(self, attraction_id):
+        """
+        Returns the most recent 'YYYY-MM' review month stored for the attraction; None if nothing is stored yet.
+        """
+
+        return self.connection.execute('SELECT MAX(review_month) FROM reviews WHERE attraction_id = ?',
+                                       (attraction_id,)).fetchone()[0]
+
+    def save_page(self, attraction_id, page_offset, reviews_list):
+        """
+        Stores the reviews of a listing page & marks the page as completed (unless page_offset is None), in a single transaction.
+
+        Args:
+            attraction_id (str): Attraction the page belongs to
+            page_offset (int): Offset of the listing page (the 'or{}' part of the url); None to only store the reviews
+            reviews_list (list of dict): Reviews as returned by ta_attraction_reviews_parser, with attraction_name & attraction_id set
+        """
+
+        scraped_at = datetime.now(timezone.utc).isoformat()
+        rows = [tuple(_to_sql_value(review.get(column)) for column in REVIEW_COLUMNS) +
+                (review_month(review.get('review_date')), scraped_at)
+                for review in reviews_list if review.get('review_link')]
+
+        with self.connection:
+            self.connection.executemany(
+                f'INSERT OR REPLACE INTO reviews ({", ".join(REVIEW_COLUMNS)}, review_month, scraped_at) '
+                f'VALUES ({", ".join("?" * (len(REVIEW_COLUMNS) + 2))})', rows)
+            if page_offset is not None:
+                self.connection.execute('INSERT OR REPLACE INTO completed_pages VALUES (?, ?, ?)',
+                                        (attraction_id, page_offset, scraped_at))
+
+    def reviews_dataframe(self, attraction_id = None):
+        """
+        Returns the stored reviews as a DataFrame with the same columns as the data acquisition notebook.
+        """
+
+        query = f'SELECT {", ".join(REVIEW_COLUMNS)} FROM reviews'
+        params = ()
+        if attraction_id is not None:
+            query += ' WHERE attraction_id = ?'
+            params = (attraction_id,)
+
+        df_reviews = pd.read_sql_query(query, self.connection, params = params)
+        df_reviews['helpful_votes'] = pd.to_numeric(df_reviews.helpful_votes)
+        df_reviews['rating'] = pd.to_numeric(df_reviews.rating)
+        return df_reviews
+
+    def close(self):
+        self.connection.close()
+
+def _to_sql_value(value):
+    """
+    Missing values (None/NaN) are stored as NULL, everything else as text.
+    """
+
+    if value is None or value != value:
+        return None
+    return str(value)
@@ -2,56 +2,96 @@
 This python module is for scraping information from Trip Advisor. 
 """
 
-from bs4 import BeautifulSoup
+from bs4 import BeautifulSoup, SoupStrainer
 from selenium import webdriver
-import pickle
 import time
 import numpy as np
 import pandas as pd
-import requests
 import re
+from functools import partial
+from review_fetcher import default_fetcher
+from scrape_store import review_month
 
-def ta_userreviews_review_parser(review_url):
+# BeautifulSoup backend used for all the pages. 'lxml' is the fastest; 'html5lib' & 'html.parser' are also supported.
+HTML_PARSER = 'lxml'
+
+# Only these nodes are materialized when parsing a page. Note that html5lib does not support SoupStrainer & builds the full tree.
+REVIEW_TEXT_STRAINER = SoupStrainer('span', class_ = 'fullText')
+REVIEWS_LISTING_STRAINER = SoupStrainer('div', class_ = 'Dq9MAugU T870kzTX LnVzGwUB')
+
+# Number of listing pages re-read before the last completed one when resuming, to pick up reviews shifted by newly posted ones
+RESUME_MARGIN_PAGES = 2
+
+def ta_userreviews_review_parser(review_url, fetcher = None):
 
     """
     Take in the url for a specific user review in Trip Advisor and returns just the text portion of the review as a tring
     'ta' in the function name stands for Trip Advisor
     Args:
         review_url (str): review url
+        fetcher (ReviewFetcher, optional): Fetcher used for the page, with its timeout & retries. Defaults to the shared default_fetcher().
     Output:
         review_text (str): paragraph containing the review; will return None if the review could not be retrieved. 
     """
 
-    url = "https://www.tripadvisor.in" + review_url
+    review_html = (fetcher or default_fetcher()).fetch(review_url)
+    if review_html is None:
+        return None
 
     try:
-        response = requests.get(url)
-
-        if response.status_code == 200:
-            soup = BeautifulSoup(response.text, 'html5lib')
-            review_text = soup.find('span', class_ = 'fullText').text
-            return review_text
-        else:
-            return None
+        return ta_userreviews_review_text(review_html)
     except:
         return None
 
+def ta_userreviews_review_text(review_html, parser = HTML_PARSER):
+
+    """
+    Extracts the full review text from the html page of a specific user review in Trip Advisor.
+    Args:
+        review_html (str): html page source of the review
+        parser (str, optional): BeautifulSoup backend to be used. Defaults to HTML_PARSER.
+    Output:
+        review_text (str): paragraph containing the review; will return None if the review text is not present in the page.
+    """
+
+    soup = BeautifulSoup(review_html, parser, parse_only = REVIEW_TEXT_STRAINER)
+    review_text_span = soup.find('span', class_ = 'fullText')
+    return review_text_span.text if review_text_span else None
+
+def ta_listing_page_soup(page_html, parser = HTML_PARSER):
+
+    """
+    Parses a Trip Advisor attraction reviews page, only keeping the review blocks needed by ta_attraction_reviews_parser.
+    Args:
+        page_html (str): html page source of the attraction reviews page
+        parser (str, optional): BeautifulSoup backend to be used. Defaults to HTML_PARSER.
+    Output:
+        soup (BeautifulSoup): parsed page, to be passed into ta_attraction_reviews_parser
+    """
+
+    return BeautifulSoup(page_html, parser, parse_only = REVIEWS_LISTING_STRAINER)
 
 
-def ta_attraction_reviews_parser(ta_reviews_page_soup):
+def ta_attraction_reviews_parser(ta_reviews_page_soup, fetcher = None, skip_review_links = None, parser = HTML_PARSER):
 
     """
     Takes in a Trip Advisor html page source containing reviews for a particular attraction/destination &
     parses the reviews in that page.
     'ta' in the above function name stands for 'Trip Advisor'
 
+    The full text of every review in the page is fetched concurrently, using the provided fetcher.
+
     Input: HTML Page Source, Location ID
+           fetcher [ReviewFetcher] - Fetcher used for the review pages. Defaults to a shared ReviewFetcher with default settings.
+           skip_review_links [set] - Review links already scraped; these reviews are neither fetched nor returned.
+           parser [str] - BeautifulSoup backend used for the review pages. Defaults to HTML_PARSER.
     Output: reviews_list - List containing all the reviews in the page.
             Each list element is a dictionary with the following keys: attraction_id, user_id, user_name, review_date, rating,                     review_title,  review, expr_date
     """
 
 
     reviews_list = []
+    pending_reviews = []
     reviews_soup = ta_reviews_page_soup.find_all('div', class_='Dq9MAugU T870kzTX LnVzGwUB')
 
     for review in reviews_soup:
@@ -62,9 +102,10 @@ def ta_attraction_reviews_parser(ta_reviews_page_soup):
 
             if reviews_trimmed_text:
 
+                user_link = review.find('a' , class_="_1r_My98y")
                 try:
-                    reviews_dict['user_name'] = review.find('a' , class_="_1r_My98y").text
-                    reviews_dict['user_profile_link'] = review.find('a' , class_="_1r_My98y").get('href')
+                    reviews_dict['user_name'] = user_link.text
+                    reviews_dict['user_profile_link'] = user_link.get('href')
                 except:
                     reviews_dict['user_profile_link'] = None
                     reviews_dict['user_name'] = None
@@ -86,19 +127,22 @@ def ta_attraction_reviews_parser(ta_reviews_page_soup):
                 except:
                     reviews_dict['rating'] = np.nan
                 
+                title_link = review.find('a', class_='ocfR3SKN')
                 try:
-                    reviews_dict['review_link'] = review.find('a', class_='ocfR3SKN').get('href')
-                    review_text = ta_userreviews_review_parser(reviews_dict['review_link'])
-
-                    if review_text:
-                        reviews_dict['review_text'] = review_text
-                    else:
+                    reviews_dict['review_link'] = title_link.get('href')
+                    if skip_review_links and reviews_dict['review_link'] in skip_review_links:
                         continue
+                    if reviews_dict['review_link']:
+                        # The review text is fetched for all the reviews together, once the page is parsed
+                        pending_reviews.append(reviews_dict)
+                    else:
+                        # Same as before, a review whose full text can't be retrieved is ignored
+                        reviews_dict['review_text'] = None
                 except:
                     reviews_dict['review_link'] = None                
                 
                 try:
-                    reviews_dict['review_title'] = review.find('a', class_='ocfR3SKN').text
+                    reviews_dict['review_title'] = title_link.text
                 except:
                     reviews_dict['review_title'] = None
                 
@@ -112,6 +156,126 @@ def ta_attraction_reviews_parser(ta_reviews_page_soup):
 
         reviews_list.append(reviews_dict)
 
+    if pending_reviews:
+        fetcher = fetcher or default_fetcher()
+        review_texts = fetcher.fetch_many([reviews_dict['review_link'] for reviews_dict in pending_reviews],
+                                          parse = partial(ta_userreviews_review_text, parser = parser))
+        for reviews_dict, review_text in zip(pending_reviews, review_texts):
+            reviews_dict['review_text'] = review_text
+
+        # Same as before, reviews whose full text could not be retrieved are ignored
+        reviews_list = [reviews_dict for reviews_dict in reviews_list if reviews_dict.get('review_text', True)]
+
+    return reviews_list
+
+
+def ta_attraction_pages(url_template, attraction_name, attraction_id, n_reviews, fetcher = None, start_offset = 0,
+                        skip_review_links = None, parser = HTML_PARSER):
+
+    """
+    Generator going over the listing pages of an attraction one at a time, so only one page of reviews is held in memory.
+    'ta' in the above function name stands for 'Trip Advisor'
+
+    Input: url_template [str] - Attraction reviews url with '{}' in place of the page offset (5 reviews per page)
+           attraction_name [str], attraction_id [str] - Added to every review
+           n_reviews [int] - Number of reviews of the attraction, which sets the last page offset
+           fetcher [ReviewFetcher] - Fetcher used for the listing & review pages. Defaults to a shared ReviewFetcher.
+           start_offset [int] - Offset of the first listing page to fetch. Defaults to 0 (the newest reviews).
+           skip_review_links [set] - Review links already scraped, see ta_attraction_reviews_parser
+           parser [str] - BeautifulSoup backend used for the listing & review pages. Defaults to HTML_PARSER.
+    Output: Yields a tuple of (page_offset, reviews_list) for every page that could be retrieved
+    """
+
+    fetcher = fetcher or default_fetcher()
+
+    for page_offset in range(start_offset, n_reviews + 1, 5):
+        page_html = fetcher.fetch(url_template.format(page_offset))
+        if page_html is None:
+            print(f"Could not retrieve page {url_template.format(page_offset)}")
+            continue
+
+        soup = ta_listing_page_soup(page_html, parser)
+        reviews_list = ta_attraction_reviews_parser(soup, fetcher, skip_review_links = skip_review_links, parser = parser)
+
+        for reviews_dict in reviews_list:
+            reviews_dict['attraction_name'] = attraction_name
+            reviews_dict['attraction_id'] = attraction_id
+
+        yield page_offset, reviews_list
+
+def ta_attraction_reviews_stream(url_template, attraction_name, attraction_id, n_reviews, fetcher = None, parser = HTML_PARSER):
+
+    """
+    Generator yielding the reviews of an attraction one by one, as their listing pages get scraped.
+    Meant to be written out incrementally, e.g. with review_stream.JsonLinesReviewWriter, to scrape in bounded memory.
+    'ta' in the above function name stands for 'Trip Advisor'
+
+    Input: see ta_attraction_pages
+    Output: Yields review dictionaries, with the same keys as ta_attraction_reviews_parser plus attraction_name & attraction_id
+    """
+
+    for _, reviews_list in ta_attraction_pages(url_template, attraction_name, attraction_id, n_reviews, fetcher,
+                                               parser = parser):
+        yield from reviews_list
+
+
+def ta_attraction_scraper(url_template, attraction_name, attraction_id, n_reviews, store, fetcher = None, only_new = False,
+                          parser = HTML_PARSER):
+
+    """
+    Scrapes all the listing pages of an attraction, saving every page's reviews into the checkpoint store as soon as it is parsed.
+    Reviews already in the store are not fetched again. An interrupted run resumes a few pages (RESUME_MARGIN_PAGES) before
+    the first page that was not completed, as reviews posted since then shift the older ones onto later pages; the reviews
+    read again this way are skipped by their review link.
+    'ta' in the above function name stands for 'Trip Advisor'
+
+    Input: url_template [str] - Attraction reviews url with '{}' in place of the page offset (5 reviews per page)
+           attraction_name [str], attraction_id [str] - Stored along with every review
+           n_reviews [int] - Number of reviews of the attraction, which sets the last page offset
+           store [ScrapeCheckpointStore] - Store holding the scraped reviews & completed pages
+           fetcher [ReviewFetcher] - Fetcher used for the listing & review pages. Defaults to a shared ReviewFetcher.
+           only_new [bool] - Refresh mode: listing pages are read from the newest reviews onwards, and the scrape stops at
+                             the first page without any new review as recent as the last review month seen in the store.
+           parser [str] - BeautifulSoup backend used for the listing & review pages. Defaults to HTML_PARSER.
+    Output: n_new_reviews [int] - Number of new reviews stored
+    """
+
+    known_links = store.known_review_links(attraction_id)
+    last_month = store.last_review_month(attraction_id) if only_new else None
+    start_offset = 0 if only_new else resume_offset(store.completed_pages(attraction_id))
+    n_new_reviews = 0
+
+    # known_links is updated after every page, which the generator sees as it shares the same set
+    pages = ta_attraction_pages(url_template, attraction_name, attraction_id, n_reviews, fetcher,
+                                start_offset = start_offset, skip_review_links = known_links, parser = parser)
+
+    for page_offset, reviews_list in pages:
+        # A refresh stops early, so its pages are not recorded as completed
+        store.save_page(attraction_id, None if only_new else page_offset, reviews_list)
+        known_links.update(reviews_dict['review_link'] for reviews_dict in reviews_list if reviews_dict.get('review_link'))
+        n_new_reviews += len(reviews_list)
+
+        if only_new and last_month:
+            # Unparseable dates such as 'Yesterday' are treated as recent
+            page_months = [review_month(reviews_dict.get('review_date')) or '9999-12' for reviews_dict in reviews_list]
+            if not any(month >= last_month for month in page_months):
+                break
+
+    return n_new_reviews
+
+def resume_offset(completed_pages, margin_pages = RESUME_MARGIN_PAGES):
+
+    """
+    Offset a scrape resumes from: 'margin_pages' pages before the first listing page that was not completed, so that
+    pages which failed in the previous run are read again.
+
+    Input: completed_pages [set] - Offsets of the completed listing pages, see ScrapeCheckpointStore.completed_pages
+           margin_pages [int] - Number of completed pages read again. Defaults to RESUME_MARGIN_PAGES.
+    Output: page_offset [int] - Offset of the first listing page to fetch
+    """
 
+    page_offset = 0
+    while page_offset in completed_pages:
+        page_offset += 5
 
-    return reviews_list
\ No newline at end of file
+    return max(0, page_offset - 5 * margin_pages)
@@ -0,0 +1,167 @@
+"""
+    Python module to vectorize corpora that don't fit in memory, one chunk of preprocessed reviews at a time.
+
+    Words are mapped to columns with a hashing vectorizer, so no vocabulary has to be held in memory up front.
+    A first pass over the chunks counts the document frequency of every hashed column (for min_df/max_df & idf),
+    and a second pass writes the TF-IDF rows of every chunk to disk, building a CSR matrix that is then memory-mapped.
+    Peak memory is bounded by the chunk size & n_features, and the result can be fed to lda_topic_modeling /
+    nmf_topic_modeling, or chunk by chunk to lda_partial_fit_topic_modeling.
+"""
+
+import json
+import os
+
+import numpy as np
+import scipy.sparse as ss
+from sklearn.feature_extraction.text import HashingVectorizer
+from sklearn.preprocessing import normalize
+from sklearn.utils import murmurhash3_32
+
+class StreamingTfidfVectorizer:
+    """
+        TF-IDF (or binary/count) vectorizer fitted & applied chunk by chunk over hashed features.
+    Args:
+        n_features (int, optional): Number of hashed columns before min_df/max_df filtering. Defaults to 2**20.
+        ngram_range (tuple, optional): Same as sklearn's vectorizers. Defaults to (1, 1).
+        min_df (int or float, optional): Columns in fewer documents (count, or fraction if float) are dropped. Defaults to 1.
+        max_df (int or float, optional): Columns in more documents (count, or fraction if float) are dropped. Defaults to 1.0.
+        binary (bool, optional): Use 0/1 term presence instead of counts. Defaults to False.
+        use_idf (bool, optional): Weight the terms by inverse document frequency (smoothed, same as TfidfVectorizer). Defaults to True.
+        norm (str, optional): Row normalization, 'l2', 'l1' or None. Defaults to 'l2'.
+        track_vocab (bool, optional): Record a word for every kept column (the first one seen, in case of hash collisions),
+            at the cost of analyzing every document twice in the first pass. Defaults to False i.e. columns are named 'hash_<column>'.
+    """
+
+    def __init__(self, n_features = 2 ** 20, ngram_range = (1, 1), min_df = 1, max_df = 1.0, binary = False,
+                 use_idf = True, norm = 'l2', track_vocab = False):
+        self.n_features = n_features
+        self.min_df = min_df
+        self.max_df = max_df
+        self.binary = binary
+        self.use_idf = use_idf
+        self.norm = norm
+        self.track_vocab = track_vocab
+        self.hashing_vectorizer = HashingVectorizer(n_features = n_features, ngram_range = ngram_range, binary = binary,
+                                                    alternate_sign = False, norm = None)
+
+    def fit(self, chunks):
+        """
+            First pass: counts the document frequency of every hashed column across the chunks.
+        Args:
+            chunks ([iterable of iterables of str]): Chunks of preprocessed reviews, e.g. lists or pd.Series
+        Returns:
+            self
+        """
+
+        document_frequency = np.zeros(self.n_features, dtype = np.int64)
+        column_words = {}
+        n_documents = 0
+        analyzer = self.hashing_vectorizer.build_analyzer()
+
+        for chunk in chunks:
+            chunk = list(chunk)
+            doc_word = self.hashing_vectorizer.transform(chunk)
+            doc_word.sum_duplicates()
+            document_frequency += np.bincount(doc_word.indices, minlength = self.n_features)
+            n_documents += doc_word.shape[0]
+
+            if self.track_vocab:
+                for word in {word for text in chunk for word in analyzer(text)}:
+                    column_words.setdefault(abs(murmurhash3_32(word, seed = 0)) % self.n_features, word)
+
+        min_df = self.min_df * n_documents if isinstance(self.min_df, float) else self.min_df
+        max_df = self.max_df * n_documents if isinstance(self.max_df, float) else self.max_df
+
+        self.n_documents_ = n_documents
+        self.kept_columns_ = np.flatnonzero((document_frequency >= min_df) & (document_frequency <= max_df) &
+                                            (document_frequency > 0))
+        # Maps every hashed column to its compact column, -1 for the dropped ones
+        self.column_map_ = np.full(self.n_features, -1, dtype = np.int64)
+        self.column_map_[self.kept_columns_] = np.arange(len(self.kept_columns_))
+        self.idf_ = (np.log((1 + n_documents) / (1 + document_frequency[self.kept_columns_])) + 1).astype(np.float32)
+        self.vocabulary_ = np.array([column_words.get(column, f'hash_{column}') for column in self.kept_columns_])
+        return self
+
+    def transform(self, chunk):
+        """
+            Vectorizes a single chunk into a CSR matrix over the kept columns.
+        """
+
+        doc_word = self.hashing_vectorizer.transform(list(chunk)).tocoo()
+        columns = self.column_map_[doc_word.col]
+        kept = columns >= 0
+        data = doc_word.data[kept].astype(np.float32)
+        if self.use_idf:
+            data *= self.idf_[columns[kept]]
+
+        matrix = ss.csr_matrix((data, (doc_word.row[kept], columns[kept])),
+                               shape = (doc_word.shape[0], len(self.kept_columns_)), dtype = np.float32)
+        return normalize(matrix, norm = self.norm, copy = False) if self.norm else matrix
+
+    def iter_transform(self, chunks):
+        """
+            Yields the CSR matrix of every chunk, e.g. for partial_fit.
+        """
+
+        for chunk in chunks:
+            yield self.transform(chunk)
+
+    def transform_to_disk(self, chunks, directory):
+        """
+            Second pass: vectorizes the chunks & appends their CSR arrays to files in the directory,
+            then returns the full matrix memory-mapped from those files.
+        Args:
+            chunks ([iterable of iterables of str]): Same chunks as the ones used to fit
+            directory (str): Folder where data.bin, indices.bin, indptr.bin & matrix.json are written
+        Returns:
+            [scipy CSR matrix]: Memory-mapped document-term matrix, see load_memmap_csr
+        """
+
+        os.makedirs(directory, exist_ok = True)
+        n_rows = 0
+        nnz = 0
+        with open(os.path.join(directory, 'data.bin'), 'wb') as data_file, \
+             open(os.path.join(directory, 'indices.bin'), 'wb') as indices_file, \
+             open(os.path.join(directory, 'indptr.bin'), 'wb') as indptr_file:
+            np.zeros(1, dtype = np.int64).tofile(indptr_file)
+            for matrix in self.iter_transform(chunks):
+                matrix.data.astype(np.float32).tofile(data_file)
+                matrix.indices.astype(np.int32).tofile(indices_file)
+                (matrix.indptr[1:].astype(np.int64) + nnz).tofile(indptr_file)
+                n_rows += matrix.shape[0]
+                nnz += matrix.nnz
+
+        # scipy casts indices & indptr to a common index dtype, which would copy the memory-mapped int32 indices
+        # unless indptr is int32 as well. indptr only has one entry per row, so it is rewritten when nnz allows it.
+        indptr_dtype = 'int64'
+        if nnz < 2 ** 31:
+            indptr_path = os.path.join(directory, 'indptr.bin')
+            np.fromfile(indptr_path, dtype = np.int64).astype(np.int32).tofile(indptr_path)
+            indptr_dtype = 'int32'
+
+        with open(os.path.join(directory, 'matrix.json'), 'w') as metadata_file:
+            json.dump({'shape': [n_rows, len(self.kept_columns_)], 'nnz': nnz, 'indptr_dtype': indptr_dtype}, metadata_file)
+        np.save(os.path.join(directory, 'vocabulary.npy'), self.vocabulary_)
+
+        return load_memmap_csr(directory)
+
+def load_memmap_csr(directory):
+    """
+        Memory-maps a matrix written by StreamingTfidfVectorizer.transform_to_disk as a CSR matrix (nothing is read up front).
+    Returns:
+        [scipy CSR matrix]: Document-term matrix backed by the files in the directory
+    """
+
+    with open(os.path.join(directory, 'matrix.json')) as metadata_file:
+        metadata = json.load(metadata_file)
+    n_rows, n_columns = metadata['shape']
+    nnz = metadata['nnz']
+
+    def memmap(name, dtype, length):
+        # np.memmap can't map empty files, which happens for an empty corpus
+        if length == 0:
+            return np.zeros(0, dtype = dtype)
+        return np.memmap(os.path.join(directory, name), dtype = dtype, mode = 'r', shape = (length,))
+
+    return ss.csr_matrix((memmap('data.bin', np.float32, nnz), memmap('indices.bin', np.int32, nnz),
+                          memmap('indptr.bin', np.dtype(metadata['indptr_dtype']), n_rows + 1)), shape = (n_rows, n_columns), copy = False)
@@ -15,12 +15,37 @@ import numpy as np
 import pickle
 import numpy as np
 from collections import defaultdict
-from recommender_and_other_functions import yosemite_attraction_reco
-from sklearn.metrics.pairwise import cosine_similarity
-
-# Loading Dataframe & Storing list of options to show to user from dataframe's column names
-df = pd.read_csv("../Data/Attractions_Topics_Summary_Scores.csv", index_col = 0)
-options = df.columns.tolist()[0:12]
+from itertools import product
+from recommender_and_other_functions import AttractionRecommender
+
+@st.cache(allow_output_mutation = True)
+def load_recommendations(path = "../Data/Attractions_Topics_Summary_Scores.csv"):
+    """
+    Loads the attractions dataframe & precomputes the recommendations for every combination of the 3 priorities.
+    Cached by streamlit, so this only runs once per process instead of on every widget interaction.
+
+    Returns:
+        options [list]: Topics shown to the user, from the dataframe's column names
+        recommendations [dict]: Top 3 attractions keyed by (priority_1, priority_2, priority_3)
+    """
+
+    df = pd.read_csv(path, index_col = 0)
+    options = df.columns.tolist()[0:12]
+
+    recommender = AttractionRecommender(df)
+    priority_combinations = list(product(options, repeat = 3))
+    users_weights = []
+    for priorities in priority_combinations:
+        user_inputs = defaultdict(int)
+        for priority in priorities:
+            user_inputs[priority] = 1
+        users_weights.append(user_inputs)
+
+    recommendations = dict(zip(priority_combinations, recommender.recommend_batch(users_weights)))
+    return options, recommendations
+
+# Storing list of options to show to user & the lookup table of recommendations
+options, recommendations = load_recommendations()
 
 # Creating a sidebar for aesthetic appeal
 st.sidebar.markdown(" **Yosemite NP Trip Advisor** ")
@@ -64,16 +89,11 @@ priority_3 = st.radio("Third Highest Priority:", options, index = 8, key="priori
 # priority_2 = 'Easy Trails'
 # priority_3 = 'Wildlife'
 
-user_inputs = defaultdict(int)
-user_inputs[priority_1] = 1
-user_inputs[priority_2] = 1
-user_inputs[priority_3] = 1
-
 button = st.button("Show me the suggestions!")
 
 
 if button:
-    attractions = yosemite_attraction_reco(df, user_inputs)
+    attractions = recommendations[(priority_1, priority_2, priority_3)]
     st.write(''' *Based off your preferences, following are the top 3 places recommended places:* ''')
     for i in range(len(attractions)):
         st.write(f'{i+1}.   {attractions[i]}')
@@ -0,0 +1,65 @@
+"""
+Shared fixtures: a local HTTP stand-in for Trip Advisor, so the fetching code can be tested offline.
+"""
+
+import os
+import sys
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+# The modules live as flat files in the notebooks folder
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+class LocalTripAdvisor:
+    """
+    Pages served by the stand-in server, keyed by path. A path can also be given a list of statuses
+    returned by its first requests (e.g. [503, 503] before the page), and every request is counted.
+    """
+
+    def __init__(self):
+        self.pages = {}
+        self.statuses = {}
+        self.requests = {}
+        self.lock = threading.Lock()
+        self.base_url = None
+
+    def add_page(self, path, html, statuses = ()):
+        self.pages[path] = html
+        self.statuses[path] = list(statuses)
+
+    def respond(self, path):
+        with self.lock:
+            self.requests[path] = self.requests.get(path, 0) + 1
+            if self.statuses.get(path):
+                return self.statuses[path].pop(0), ''
+        if path in self.pages:
+            return 200, self.pages[path]
+        return 404, 'Not found'
+
+@pytest.fixture
+def local_trip_advisor():
+    site = LocalTripAdvisor()
+
+    class Handler(BaseHTTPRequestHandler):
+
+        def do_GET(self):
+            status, body = site.respond(self.path)
+            content = body.encode('utf-8')
+            self.send_response(status)
+            self.send_header('Content-Type', 'text/html; charset=utf-8')
+            self.send_header('Content-Length', str(len(content)))
+            self.end_headers()
+            self.wfile.write(content)
+
+        def log_message(self, format, *args):
+            pass
+
+    server = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+    thread = threading.Thread(target = server.serve_forever, daemon = True)
+    thread.start()
+    site.base_url = f'http://127.0.0.1:{server.server_address[1]}'
+    yield site
+    server.shutdown()
+    server.server_close()
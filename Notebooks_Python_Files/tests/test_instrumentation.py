@@ -0,0 +1,50 @@
+"""
+Tests of the opt-in instrumentation, on a small stand-in for the pipeline modules.
+"""
+
+import types
+
+import pytest
+
+pytest.importorskip('numpy')
+pytest.importorskip('pandas')
+
+import instrumentation
+
+PIPELINE_SOURCE = '''
+from functools import lru_cache
+
+@lru_cache(maxsize = None)
+def get_model():
+    return object()
+
+def clean_texts(texts):
+    return [text.lower() for text in texts]
+
+def ta_attraction_pages(url_template, attraction_name, n_reviews):
+    for page_offset in range(0, n_reviews + 1, 5):
+        yield url_template.format(page_offset)
+'''
+
+@pytest.fixture
+def pipeline():
+    module = types.ModuleType('pipeline')
+    exec(PIPELINE_SOURCE, module.__dict__)
+    return module
+
+def test_records_calls_and_input_size(pipeline):
+    original = pipeline.get_model
+
+    with instrumentation.instrumented([pipeline]) as recorder:
+        model = pipeline.get_model()
+        assert pipeline.get_model() is model
+        assert pipeline.get_model.cache_info().hits == 1
+        pipeline.clean_texts(['Half Dome', 'Glacier Point'])
+        assert len(list(pipeline.ta_attraction_pages('/Reviews-or{}.html', 'Glacier Point', 10))) == 3
+
+    summary = recorder.summary()
+    assert summary.loc['pipeline.get_model', 'calls'] == 2
+    assert summary.loc['pipeline.clean_texts', ['documents', 'bytes']].tolist() == [2, 22]
+    # The url template is not counted as a document
+    assert summary.loc['pipeline.ta_attraction_pages', ['calls', 'documents', 'bytes']].tolist() == [1, 0, 0]
+    assert pipeline.get_model is original
@@ -0,0 +1,56 @@
+"""
+Tests of the corpus level text functions against the original per-row functions.
+"""
+
+import pytest
+
+pd = pytest.importorskip('pandas')
+
+import nlp_preprocessing
+
+TEXTS = ['The Valley was BEAUTIFUL!!! We hiked to the top of Yosemite Falls...',
+         'Check http://bit.ly/yose & email me@mail.com - views (great) :)',
+         "Don't miss Glacier Point; 10/10 — would go again\\again",
+         'We cannot wait to go back, gonna bring the kids',
+         'wanna see half dome again',
+         '',
+         'cannot',
+         'Tunnel View at sunset.',
+         'cafés, naïve <b>bold</b> words?']
+
+STOP_WORDS = ['the', 'to', 'we', 'was', 'of', 'a', 'and', 'me', 'at', 'go', 'can', 'not', 'na']
+
+@pytest.fixture
+def word_tokenize():
+    pytest.importorskip('nltk')
+    word_tokenize = nlp_preprocessing._get_word_tokenize()
+    try:
+        word_tokenize('tokenizer data check')
+    except LookupError:
+        pytest.skip("NLTK's punkt tokenizer data is not installed")
+    return word_tokenize
+
+def test_clean_texts_matches_cleaning():
+    texts = pd.Series(TEXTS, index = range(10, 10 + len(TEXTS)), name = 'review_text')
+
+    cleaned = nlp_preprocessing.clean_texts(texts)
+
+    assert cleaned.tolist() == [nlp_preprocessing.cleaning(text) for text in TEXTS]
+    assert cleaned.index.tolist() == texts.index.tolist()
+    assert cleaned.name == 'review_text'
+    assert nlp_preprocessing.clean_texts(TEXTS) == cleaned.tolist()
+
+@pytest.mark.parametrize('clean', [True, False])
+def test_remove_stopwords_texts_matches_remove_stopwords(word_tokenize, clean):
+    # Cleaned texts mostly take the whitespace split, except the ones with words like 'cannot' & 'wanna'
+    texts = nlp_preprocessing.clean_texts(TEXTS) if clean else TEXTS
+
+    processed = nlp_preprocessing.remove_stopwords_texts(texts, STOP_WORDS)
+
+    assert processed == [nlp_preprocessing.remove_stopwords(text, STOP_WORDS) for text in texts]
+
+def test_remove_stopwords_texts_splits_like_nltk(word_tokenize):
+    processed = nlp_preprocessing.remove_stopwords_texts(['we cannot wait', 'wanna see it'], STOP_WORDS)
+
+    # NLTK splits 'cannot' into 'can' & 'not' and 'wanna' into 'wan' & 'na', which are then removed as stop words
+    assert processed == ['wait', 'wan see it']
@@ -0,0 +1,61 @@
+"""
+Tests of the shared top-k selection against a full sort, including tied scores & exclusions.
+"""
+
+import pytest
+
+np = pytest.importorskip('numpy')
+
+from ranking import top_k_indices
+
+def random_scores(rng):
+    # Few distinct values, so that most arrays have ties, also at the cut-off
+    return rng.randint(0, 4, rng.randint(1, 30)).astype(float)
+
+def test_lowest_ties_match_stable_descending_sort():
+    rng = np.random.RandomState(0)
+    for _ in range(500):
+        scores = random_scores(rng)
+        k = rng.randint(0, len(scores) + 2)
+
+        assert top_k_indices(scores, k).tolist() == np.argsort(-scores, kind = 'stable')[:k].tolist()
+
+def test_highest_ties_match_reversed_ascending_sort():
+    rng = np.random.RandomState(1)
+    for _ in range(500):
+        scores = random_scores(rng)
+        k = rng.randint(1, len(scores) + 2)
+
+        expected = np.argsort(scores, kind = 'stable')[:-(k + 1):-1]
+        assert top_k_indices(scores, k, ties = 'highest').tolist() == expected.tolist()
+
+def test_all_tied_scores():
+    scores = np.zeros(10)
+
+    assert top_k_indices(scores, 3).tolist() == [0, 1, 2]
+    assert top_k_indices(scores, 3, ties = 'highest').tolist() == [9, 8, 7]
+
+@pytest.mark.parametrize('ties', ['lowest', 'highest'])
+def test_exclusions(ties):
+    rng = np.random.RandomState(2)
+    for _ in range(500):
+        scores = random_scores(rng)
+        excluded = rng.choice(len(scores), rng.randint(0, len(scores) + 1), replace = False).tolist()
+        k = rng.randint(0, len(scores) + 2)
+
+        kept = np.array([i for i in top_k_indices(scores, len(scores), ties = ties) if i not in excluded], dtype = int)
+        result = top_k_indices(scores, k, excluded, ties = ties)
+        assert result.tolist() == kept[:k].tolist()
+        # The caller's scores are left untouched
+        assert not np.isinf(scores).any()
+
+def test_fewer_scores_than_k():
+    scores = np.array([0.2, 0.9, 0.5], dtype = np.float32)
+
+    assert top_k_indices(scores, 5).tolist() == [1, 2, 0]
+    assert top_k_indices(scores, 5, excluded = [1, 2]).tolist() == [0]
+    assert top_k_indices(scores, 0).tolist() == []
+
+def test_unknown_tie_order():
+    with pytest.raises(ValueError):
+        top_k_indices(np.zeros(3), 1, ties = 'random')
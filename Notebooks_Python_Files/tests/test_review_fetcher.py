@@ -0,0 +1,131 @@
+"""
+Tests of the review fetcher against the local HTTP stand-in (see conftest.py).
+"""
+
+import pytest
+
+pytest.importorskip('requests')
+
+from review_fetcher import ReviewFetcher
+
+REVIEW_HTML = '<html><body><span class="fullText">Stunning views from Glacier Point</span></body></html>'
+
+def make_fetcher(site, **kwargs):
+    settings = dict(base_url = site.base_url, requests_per_second = None, timeout = 2, retries = 2, backoff_factor = 0)
+    settings.update(kwargs)
+    return ReviewFetcher(**settings)
+
+def test_fetch_returns_page(local_trip_advisor):
+    local_trip_advisor.add_page('/review_1', REVIEW_HTML)
+
+    assert make_fetcher(local_trip_advisor).fetch('/review_1') == REVIEW_HTML
+
+def test_fetch_retries_server_errors(local_trip_advisor):
+    local_trip_advisor.add_page('/review_1', REVIEW_HTML, statuses = [503, 500])
+
+    assert make_fetcher(local_trip_advisor).fetch('/review_1') == REVIEW_HTML
+    assert local_trip_advisor.requests['/review_1'] == 3
+
+def test_fetch_gives_up_after_retries(local_trip_advisor):
+    local_trip_advisor.add_page('/review_1', REVIEW_HTML, statuses = [503, 503, 503])
+
+    assert make_fetcher(local_trip_advisor).fetch('/review_1') is None
+    assert local_trip_advisor.requests['/review_1'] == 3
+
+def test_fetch_does_not_retry_missing_pages(local_trip_advisor):
+    assert make_fetcher(local_trip_advisor).fetch('/missing') is None
+    assert local_trip_advisor.requests['/missing'] == 1
+
+def test_fetch_many_keeps_order_and_parses(local_trip_advisor):
+    for i in range(10):
+        local_trip_advisor.add_page(f'/review_{i}', f'review {i}')
+
+    pages = make_fetcher(local_trip_advisor, max_workers = 4).fetch_many(
+        [f'/review_{i}' for i in range(10)] + ['/missing'], parse = str.upper)
+
+    assert pages == [f'REVIEW {i}' for i in range(10)] + [None]
+
+def test_review_parser_uses_fetcher(local_trip_advisor):
+    pytest.importorskip('selenium')
+    pytest.importorskip('lxml')
+    import scraping
+
+    local_trip_advisor.add_page('/review_1', REVIEW_HTML, statuses = [503])
+    fetcher = make_fetcher(local_trip_advisor)
+
+    assert scraping.ta_userreviews_review_parser('/review_1', fetcher) == 'Stunning views from Glacier Point'
+    assert scraping.ta_userreviews_review_parser('/missing', fetcher) is None
+
+def test_fetch_many_turns_invalid_urls_into_none(local_trip_advisor):
+    local_trip_advisor.add_page('/review_1', 'review 1')
+
+    assert make_fetcher(local_trip_advisor).fetch_many(['/review_1', None]) == ['review 1', None]
+
+def test_reviews_parser_drops_reviews_without_link(local_trip_advisor):
+    pytest.importorskip('selenium')
+    pytest.importorskip('lxml')
+    import scraping
+    from benchmarks import synthetic_listing_page
+
+    page_html, review_pages = synthetic_listing_page(3)
+    first_link = next(iter(review_pages))
+    page_html = page_html.replace(f'href="{first_link}"', '')
+    for link, html in review_pages.items():
+        local_trip_advisor.add_page(link, html)
+
+    reviews = scraping.ta_attraction_reviews_parser(scraping.ta_listing_page_soup(page_html), make_fetcher(local_trip_advisor))
+
+    assert [review['review_link'] for review in reviews] == list(review_pages)[1:]
+    assert all(review['review_text'] for review in reviews)
+
+def test_scraper_resumes_before_first_incomplete_page(local_trip_advisor, tmp_path):
+    pytest.importorskip('selenium')
+    pytest.importorskip('lxml')
+    import scraping
+    from benchmarks import synthetic_listing_page
+    from scrape_store import ScrapeCheckpointStore
+
+    for page_id in range(6):
+        page_html, review_pages = synthetic_listing_page(5, page_id = page_id)
+        local_trip_advisor.add_page(f'/Reviews-or{page_id * 5}.html', page_html)
+        for link, html in review_pages.items():
+            local_trip_advisor.add_page(link, html)
+
+    store = ScrapeCheckpointStore(str(tmp_path / 'checkpoint.sqlite'))
+    fetcher = make_fetcher(local_trip_advisor)
+    for page_offset in [0, 5, 10, 15]:
+        page_html = fetcher.fetch(f'/Reviews-or{page_offset}.html')
+        reviews_list = scraping.ta_attraction_reviews_parser(scraping.ta_listing_page_soup(page_html), fetcher)
+        for reviews_dict in reviews_list:
+            reviews_dict['attraction_id'] = 'd139187'
+        store.save_page('d139187', page_offset, reviews_list)
+    local_trip_advisor.requests.clear()
+
+    n_new_reviews = scraping.ta_attraction_scraper('/Reviews-or{}.html', 'Glacier Point', 'd139187', 25, store, fetcher)
+
+    assert scraping.resume_offset(store.completed_pages('d139187')) == 20
+    assert n_new_reviews == 10
+    assert [f'/Reviews-or{page_offset}.html' in local_trip_advisor.requests for page_offset in range(0, 30, 5)] == \
+           [False, False, True, True, True, True]
+    # Reviews of the completed pages that were read again are not fetched again
+    assert sum(count for path, count in local_trip_advisor.requests.items() if 'ShowUserReviews' in path) == 10
+
+def test_attraction_pages_use_the_given_parser(local_trip_advisor, monkeypatch):
+    pytest.importorskip('selenium')
+    import scraping
+    from benchmarks import synthetic_listing_page
+
+    page_html, review_pages = synthetic_listing_page(5)
+    local_trip_advisor.add_page('/Reviews-or0.html', page_html)
+    for link, html in review_pages.items():
+        local_trip_advisor.add_page(link, html)
+    parsers = []
+    beautiful_soup = scraping.BeautifulSoup
+    monkeypatch.setattr(scraping, 'BeautifulSoup', lambda markup, parser, **kwargs: parsers.append(parser) or
+                        beautiful_soup(markup, parser, **kwargs))
+
+    pages = list(scraping.ta_attraction_pages('/Reviews-or{}.html', 'Glacier Point', 'd139187', 4,
+                                              make_fetcher(local_trip_advisor), parser = 'html.parser'))
+
+    assert [len(reviews_list) for _, reviews_list in pages] == [5]
+    assert parsers == ['html.parser'] * 6
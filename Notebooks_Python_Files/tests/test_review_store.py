@@ -0,0 +1,75 @@
+"""
+Tests of the columnar review store: encodings, column projection & filters against the same filters in pandas.
+"""
+
+import json
+import os
+
+import pytest
+
+np = pytest.importorskip('numpy')
+pd = pytest.importorskip('pandas')
+
+from review_store import ColumnarReviewStore
+
+@pytest.fixture
+def df_reviews():
+    rng = np.random.RandomState(0)
+    n = 200
+    attractions = ['Glacier Point', 'Half Dome', 'Yosemite Falls', 'Tunnel View']
+    months = ['Jan', 'Mar', 'Jun', 'Oct', 'Dec']
+    return pd.DataFrame({
+        'attraction_name': rng.choice(attractions, n),
+        'user_name': [f'traveller{i}' for i in rng.randint(0, 20, n)],
+        'review_date': [f'{rng.choice(months)} {rng.randint(2015, 2021)}' for _ in range(n)],
+        'rating': rng.randint(1, 6, n).astype(float),
+        'review_text': [f'Review number {i} – views été' for i in range(n)],
+        'review_lemma': [f'review number {i}' for i in range(n)],
+    })
+
+def values(series):
+    return [None if pd.isna(value) else value for value in series]
+
+def test_round_trip(tmp_path, df_reviews):
+    df_reviews.loc[3, 'review_text'] = None
+    df_reviews.loc[4, 'attraction_name'] = None
+    store = ColumnarReviewStore.write(tmp_path, df_reviews)
+
+    df_read = ColumnarReviewStore(tmp_path).read()
+
+    assert len(store) == len(df_reviews)
+    for column in ['attraction_name', 'user_name', 'review_text', 'review_lemma']:
+        assert values(df_read[column]) == values(df_reviews[column])
+    assert (df_read.rating.values == df_reviews.rating.values).all()
+    assert (df_read.review_date == pd.to_datetime(df_reviews.review_date, format = '%b %Y')).all()
+
+def test_column_kinds_follow_cardinality(tmp_path, df_reviews):
+    store = ColumnarReviewStore.write(tmp_path, df_reviews)
+
+    kinds = {name: column['kind'] for name, column in store.schema.items()}
+    assert kinds == {'attraction_name': 'category', 'user_name': 'category', 'review_date': 'date',
+                     'rating': 'numeric', 'review_text': 'text', 'review_lemma': 'text'}
+    # Dictionaries are kept out of the schema, which is read on every open
+    with open(os.path.join(tmp_path, 'schema.json')) as schema_file:
+        assert 'traveller' not in schema_file.read()
+    with open(os.path.join(tmp_path, 'attraction_name.categories.json')) as categories_file:
+        assert json.load(categories_file) == sorted(df_reviews.attraction_name.unique())
+
+@pytest.mark.parametrize('filters, expected', [
+    ([('attraction_name', '==', 'Glacier Point'), ('review_date', '>=', '2018')],
+     lambda df: (df.attraction_name == 'Glacier Point') & (pd.to_datetime(df.review_date, format = '%b %Y') >= '2018-01-01')),
+    ([('attraction_name', 'in', ['Half Dome', 'Tunnel View']), ('rating', '<', 3)],
+     lambda df: df.attraction_name.isin(['Half Dome', 'Tunnel View']) & (df.rating < 3)),
+    ([('user_name', '!=', 'traveller1'), ('review_date', '<', 'Jun 2017')],
+     lambda df: (df.user_name != 'traveller1') & (pd.to_datetime(df.review_date, format = '%b %Y') < '2017-06-01')),
+    ([('review_lemma', '==', 'review number 7')], lambda df: df.review_lemma == 'review number 7'),
+])
+def test_filters_match_pandas(tmp_path, df_reviews, filters, expected):
+    store = ColumnarReviewStore.write(tmp_path, df_reviews)
+
+    df_read = store.read(['review_text'], filters = filters)
+
+    df_expected = df_reviews[expected(df_reviews)]
+    assert list(df_read.columns) == ['review_text']
+    assert df_read.index.tolist() == df_expected.index.tolist()
+    assert df_read.review_text.tolist() == df_expected.review_text.tolist()
@@ -0,0 +1,49 @@
+"""
+Tests of the chunked TF-IDF vectorizer against sklearn's TfidfVectorizer on the same corpus.
+"""
+
+import pytest
+
+np = pytest.importorskip('numpy')
+pytest.importorskip('scipy')
+sklearn_text = pytest.importorskip('sklearn.feature_extraction.text')
+
+from streaming_vectorizer import StreamingTfidfVectorizer, load_memmap_csr
+
+WORDS = ['valley', 'falls', 'trail', 'views', 'dome', 'crowded', 'parking', 'sunset', 'glacier', 'bears', 'steep', 'a']
+
+def synthetic_corpus(n = 300, seed = 0):
+    rng = np.random.RandomState(seed)
+    # Zipf like word frequencies, so that min_df & max_df both drop some words
+    p = 1 / np.arange(1, len(WORDS) + 1)
+    return [' '.join(rng.choice(WORDS, rng.randint(1, 15), p = p / p.sum())) for _ in range(n)]
+
+def chunked(texts, chunksize = 64):
+    return [texts[start:start + chunksize] for start in range(0, len(texts), chunksize)]
+
+@pytest.mark.parametrize('settings', [dict(), dict(min_df = 5, max_df = 0.6), dict(binary = True, norm = None),
+                                      dict(use_idf = False, norm = 'l1'), dict(ngram_range = (1, 2), min_df = 3)])
+def test_matches_tfidf_vectorizer(tmp_path, settings):
+    texts = synthetic_corpus()
+    expected_vectorizer = sklearn_text.TfidfVectorizer(dtype = np.float32, **settings)
+    expected = expected_vectorizer.fit_transform(texts).toarray()
+
+    vectorizer = StreamingTfidfVectorizer(track_vocab = True, **settings).fit(chunked(texts))
+    matrix = vectorizer.transform_to_disk(chunked(texts), str(tmp_path))
+
+    # Hashed columns are in a different order, so they are mapped to sklearn's columns through the words
+    assert sorted(vectorizer.vocabulary_) == sorted(expected_vectorizer.vocabulary_)
+    columns = [expected_vectorizer.vocabulary_[word] for word in vectorizer.vocabulary_]
+    np.testing.assert_allclose(matrix.toarray(), expected[:, columns], rtol = 1e-5, atol = 1e-6)
+    np.testing.assert_allclose(load_memmap_csr(str(tmp_path)).toarray(), matrix.toarray())
+
+def test_transform_of_new_chunk_uses_fitted_idf():
+    texts = synthetic_corpus()
+    expected_vectorizer = sklearn_text.TfidfVectorizer(dtype = np.float32, min_df = 2).fit(texts)
+    vectorizer = StreamingTfidfVectorizer(track_vocab = True, min_df = 2).fit(chunked(texts))
+
+    new_texts = synthetic_corpus(20, seed = 1) + ['unknown words only']
+    columns = [expected_vectorizer.vocabulary_[word] for word in vectorizer.vocabulary_]
+
+    np.testing.assert_allclose(vectorizer.transform(new_texts).toarray(),
+                               expected_vectorizer.transform(new_texts).toarray()[:, columns], rtol = 1e-5, atol = 1e-6)
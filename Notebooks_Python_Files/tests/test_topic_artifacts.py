@@ -0,0 +1,79 @@
+"""
+Tests of the topic model bundle: incremental attraction scores & review link bookkeeping.
+"""
+
+import pytest
+
+pd = pytest.importorskip('pandas')
+pytest.importorskip('joblib')
+sklearn_text = pytest.importorskip('sklearn.feature_extraction.text')
+sklearn_decomposition = pytest.importorskip('sklearn.decomposition')
+
+from topic_artifacts import TopicModelBundle
+
+TOPICS = ['Views', 'Hiking', 'Family']
+WORDS = ['view', 'sunset', 'valley', 'trail', 'hike', 'steep', 'kids', 'family', 'picnic', 'parking']
+ATTRACTIONS = ['Glacier Point', 'Half Dome', 'Yosemite Falls']
+
+def synthetic_texts(n, seed):
+    import random
+
+    rng = random.Random(seed)
+    return [' '.join(rng.choice(WORDS) for _ in range(8)) for _ in range(n)]
+
+@pytest.fixture
+def bundle():
+    texts = synthetic_texts(60, seed = 0)
+    vectorizer = sklearn_text.CountVectorizer()
+    doc_word = vectorizer.fit_transform(texts)
+    model = sklearn_decomposition.NMF(len(TOPICS), init = 'nndsvda', max_iter = 500, random_state = 0).fit(doc_word)
+
+    df_reviews = pd.DataFrame(model.transform(doc_word), columns = TOPICS)
+    df_reviews['attraction_name'] = [ATTRACTIONS[i % 2] for i in range(len(texts))]
+    df_reviews['review_link'] = [f'/review_{i}' for i in range(len(texts))]
+    return TopicModelBundle.from_reviews(vectorizer, model, TOPICS, df_reviews), df_reviews
+
+def test_add_reviews_matches_groupby_mean(bundle):
+    bundle, df_reviews = bundle
+    texts = synthetic_texts(20, seed = 1)
+    attraction_names = [ATTRACTIONS[i % 3] for i in range(len(texts))]
+
+    scores = bundle.add_reviews(texts, attraction_names)
+
+    df_all = pd.concat([df_reviews[TOPICS + ['attraction_name']], scores], ignore_index = True)
+    expected = df_all.groupby('attraction_name')[TOPICS].mean()
+    pd.testing.assert_frame_equal(bundle.attraction_scores().sort_index(), expected, check_names = False)
+    assert bundle.attraction_counts.to_dict() == df_all.attraction_name.value_counts().to_dict()
+
+def test_add_reviews_skips_counted_links(bundle):
+    bundle, df_reviews = bundle
+    texts = synthetic_texts(5, seed = 2)
+    review_links = ['/review_3', '/new_1', '/new_1', None, None]
+
+    scores = bundle.add_reviews(texts, ['Half Dome'] * 5, review_links)
+
+    # The link already in the bundle & the repeated one are skipped, reviews without a link are always added
+    assert scores.index.tolist() == [0, 1, 2]
+    assert bundle.attraction_counts['Half Dome'] == (df_reviews.attraction_name == 'Half Dome').sum() + 3
+    assert '/new_1' in bundle.review_links
+
+    assert bundle.add_reviews(texts[:2], ['Half Dome'] * 2, ['/new_1', '/review_0']).empty
+    assert bundle.attraction_counts['Half Dome'] == (df_reviews.attraction_name == 'Half Dome').sum() + 3
+
+def test_failed_add_does_not_mark_links(bundle):
+    bundle, _ = bundle
+
+    with pytest.raises(Exception):
+        bundle.add_reviews([None], ['Half Dome'], ['/new_2'])
+
+    assert '/new_2' not in bundle.review_links
+
+def test_save_and_load(bundle, tmp_path):
+    bundle, _ = bundle
+
+    assert bundle.save(tmp_path) == 1
+    bundle.add_reviews(synthetic_texts(3, seed = 3), ['Half Dome'] * 3)
+    assert bundle.save(tmp_path) == 2
+
+    pd.testing.assert_frame_equal(TopicModelBundle.load(tmp_path).attraction_scores(), bundle.attraction_scores())
+    assert TopicModelBundle.load(tmp_path, version = 1).attraction_counts.sum() == 60
@@ -0,0 +1,169 @@
+"""
+    Python module to persist the fitted topic modeling artifacts as a versioned bundle, so that newly scraped reviews
+    can be scored & folded into the attraction level topic scores without refitting anything.
+
+    A bundle holds the fitted vectorizer, the fitted topic model (CorEx, LDA or NMF) and running per attraction sums & counts
+    of the topic scores, from which the attractions-topics scores (same as groupby('attraction_name').mean()) are derived.
+"""
+
+import json
+import os
+from datetime import datetime, timezone
+
+import joblib
+import pandas as pd
+
+MANIFEST_FILE = 'manifest.json'
+
+class TopicModelBundle:
+    """
+    Fitted vectorizer & topic model, along with the running topic score sums & review counts of every attraction.
+
+    Args:
+        vectorizer: Fitted sklearn vectorizer (e.g. CountVectorizer) turning preprocessed reviews into the doc-word matrix
+        model: Fitted topic model. CorEx models are scored with predict_proba (p_y_given_x), sklearn models with transform
+        topics (list of str): Names of the topics, in the model's topic order
+        attraction_sums (pd.DataFrame): Sum of the topic scores of every attraction (rows=attractions, columns=topics)
+        attraction_counts (pd.Series): Number of reviews of every attraction
+        review_links (set, optional): Links of the reviews already counted, so they are not added twice. Defaults to empty.
+    """
+
+    def __init__(self, vectorizer, model, topics, attraction_sums, attraction_counts, review_links = None):
+        self.vectorizer = vectorizer
+        self.model = model
+        self.topics = list(topics)
+        self.attraction_sums = attraction_sums
+        self.attraction_counts = attraction_counts
+        self.review_links = set(review_links) if review_links is not None else set()
+        self.version = None
+
+    @classmethod
+    def from_reviews(cls, vectorizer, model, topics, df_reviews):
+        """
+        Creates the bundle from the reviews the model was fitted on.
+
+        Args:
+            df_reviews (pd.DataFrame): Reviews with an 'attraction_name' column, one column per topic with its scores
+                                       & optionally a 'review_link' column
+        """
+
+        grouped = df_reviews.groupby('attraction_name')[topics]
+        review_links = df_reviews['review_link'].dropna().tolist() if 'review_link' in df_reviews else None
+        return cls(vectorizer, model, topics, grouped.sum(), grouped.size(), review_links)
+
+    def transform(self, texts):
+        """
+        Topic scores of preprocessed reviews, using the fitted vectorizer & model only (no refit).
+
+        Args:
+            texts (pd.Series or list of str): Reviews preprocessed the same way as the ones the model was fitted on
+
+        Returns:
+            [pd.DataFrame]: Topic scores, one row per review & one column per topic
+        """
+
+        doc_word = self.vectorizer.transform(texts)
+        if hasattr(self.model, 'p_y_given_x'):
+            # CorEx returns binary labels with transform, so the probabilities are used instead, same as the notebook
+            scores = self.model.predict_proba(doc_word)[0]
+        else:
+            scores = self.model.transform(doc_word)
+
+        index = texts.index if isinstance(texts, pd.Series) else None
+        return pd.DataFrame(scores, columns = self.topics, index = index)
+
+    def add_reviews(self, texts, attraction_names, review_links = None):
+        """
+        Scores new reviews & folds them into the attraction sums & counts. Reviews whose link was already counted are skipped.
+
+        Args:
+            texts (pd.Series or list of str): Preprocessed new reviews
+            attraction_names (list of str): Attraction of every review
+            review_links (list of str, optional): Link of every review, used to skip reviews already counted. Defaults to None.
+
+        Returns:
+            [pd.DataFrame]: Topic scores of the reviews that were added, along with their attraction_name
+        """
+
+        df_new = pd.DataFrame({'text': list(texts), 'attraction_name': list(attraction_names)})
+        if review_links is not None:
+            df_new['review_link'] = list(review_links)
+            # Reviews without a link can't be told apart, so they are always added
+            has_link = df_new.review_link.notna()
+            already_counted = df_new.review_link.isin(self.review_links) | df_new.review_link.duplicated()
+            df_new = df_new[~(has_link & already_counted)]
+
+        if df_new.empty:
+            return pd.DataFrame(columns = self.topics + ['attraction_name'])
+
+        scores = self.transform(df_new.text.tolist())
+        scores['attraction_name'] = df_new.attraction_name.values
+
+        grouped = scores.groupby('attraction_name')[self.topics]
+        self.attraction_sums = self.attraction_sums.add(grouped.sum(), fill_value = 0)
+        self.attraction_counts = self.attraction_counts.add(grouped.size(), fill_value = 0).astype(int)
+        # Links are only marked as counted once the reviews were scored & added, so a failed call can be retried
+        if 'review_link' in df_new:
+            self.review_links.update(df_new.review_link.dropna())
+
+        return scores
+
+    def attraction_scores(self):
+        """
+        Attractions-topics scores (mean topic score of every attraction's reviews), as saved in Attractions_Topics_Summary_Scores.csv
+        """
+
+        return self.attraction_sums.div(self.attraction_counts, axis = 0)
+
+    def save(self, directory):
+        """
+        Saves the bundle as a new version in the directory & records it in the directory's manifest.
+
+        Returns:
+            [int]: Version number of the saved bundle
+        """
+
+        os.makedirs(directory, exist_ok = True)
+        manifest = _read_manifest(directory)
+        version = max((entry['version'] for entry in manifest['versions']), default = 0) + 1
+
+        file_name = f'topic_bundle_v{version:04d}.joblib'
+        joblib.dump(self, os.path.join(directory, file_name), compress = 3)
+
+        manifest['versions'].append({'version': version, 'file': file_name,
+                                     'created_at': datetime.now(timezone.utc).isoformat(),
+                                     'n_reviews': int(self.attraction_counts.sum()),
+                                     'n_attractions': len(self.attraction_counts)})
+        manifest['latest'] = version
+        with open(os.path.join(directory, MANIFEST_FILE), 'w') as manifest_file:
+            json.dump(manifest, manifest_file, indent = 2)
+
+        self.version = version
+        return version
+
+    @classmethod
+    def load(cls, directory, version = None):
+        """
+        Loads a saved bundle, the latest version unless a version number is provided.
+        """
+
+        manifest = _read_manifest(directory)
+        version = manifest['latest'] if version is None else version
+        entry = next((entry for entry in manifest['versions'] if entry['version'] == version), None)
+        if entry is None:
+            raise FileNotFoundError(f'No topic bundle version {version} in {directory}')
+
+        bundle = joblib.load(os.path.join(directory, entry['file']))
+        bundle.version = version
+        return bundle
+
+def _read_manifest(directory):
+    """
+    Reads the manifest listing the saved versions; an empty manifest if nothing was saved yet.
+    """
+
+    path = os.path.join(directory, MANIFEST_FILE)
+    if not os.path.exists(path):
+        return {'latest': None, 'versions': []}
+    with open(path) as manifest_file:
+        return json.load(manifest_file)
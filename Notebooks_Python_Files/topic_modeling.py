@@ -5,22 +5,30 @@
     Author: Navish Agarwal
 """
 
+import time
 import pandas as pd
 import numpy as np
+import scipy.sparse as ss
+from joblib import Parallel, delayed, effective_n_jobs
 from sklearn.feature_extraction.text import TfidfVectorizer
 from sklearn.decomposition import TruncatedSVD, LatentDirichletAllocation, NMF
 from sklearn.metrics.pairwise import cosine_similarity
+from memory_monitor import PeakMemoryMonitor
+from ranking import top_k_indices
 
-def lda_topic_modeling(word_matrix, vocab, n = 5):
+def lda_topic_modeling(word_matrix, vocab, n = 5, output = 'dataframe', sparse_threshold = None):
     """
         Perform LDA topic modelling using sklearn on the provided doc-word vector.
     Args:
         word_matrix ([Numpy Matrix]): TF-IDF or Word Count Frequency Vector
         vocab ([List of strings]): Contains all the words that make up the entire vocabulary. Equals # of columns in the above vector
         n (int, optional): Number of topics to be generated. Defaults to 5.
+        output (str, optional): 'dataframe' or 'arrays' for compact float32 arrays (see TopicMatrices). Defaults to 'dataframe'.
+        sparse_threshold (float, optional): With 'arrays', scores below this value are dropped & the matrices stored as CSR. Defaults to None (dense).
 
     Returns:
-        Returns a tuple containing 4 elements
+        With output = 'arrays', returns a tuple of the model, score & a TopicMatrices object. Otherwise,
+        returns a tuple containing 4 elements
         lda [Sklearn LDA Model]: The fitted LDA model
         lda.bound_ [float]: LDA score
         topic_matrix [Pandas Dataframe]: Dataframe containing topics scores of every document (columns=topics, rows=documents)
@@ -28,22 +36,27 @@ def lda_topic_modeling(word_matrix, vocab, n = 5):
     """
     lda = LatentDirichletAllocation(n_components=n, random_state=0, max_iter = 100, n_jobs = -1, verbose = 1)
     lda.fit(word_matrix)
+    if output == 'arrays':
+        return lda, lda.bound_, TopicMatrices.from_model(lda, word_matrix, vocab, sparse_threshold)
     topic_matrix = pd.DataFrame(lda.transform(word_matrix)).add_prefix("topic_")
     word_matrix = pd.DataFrame(lda.components_, \
         columns = vocab).T.add_prefix('topic_')
 
     return lda, lda.bound_, topic_matrix, word_matrix
 
-def nmf_topic_modeling (word_matrix, vocab, n = 5):
+def nmf_topic_modeling (word_matrix, vocab, n = 5, output = 'dataframe', sparse_threshold = None):
     """
         Perform NMF topic modelling using sklearn on the provided doc-word vector.
     Args:
         word_matrix ([Numpy Matrix]): TF-IDF or Word Count Frequency Vector
         vocab ([List of strings]): Contains all the words that make up the entire vocabulary. Equals # of columns in the above vector
         n (int, optional): Number of topics to be generated. Defaults to 5.
+        output (str, optional): 'dataframe' or 'arrays' for compact float32 arrays (see TopicMatrices). Defaults to 'dataframe'.
+        sparse_threshold (float, optional): With 'arrays', scores below this value are dropped & the matrices stored as CSR. Defaults to None (dense).
 
     Returns:
-        Returns a tuple containing 4 elements
+        With output = 'arrays', returns a tuple of the model, score & a TopicMatrices object. Otherwise,
+        returns a tuple containing 4 elements
         nmf [Sklearn NMF Model]: The fitted LDA model
         nmf.reconstruction_err_ [float]: NMF score
         topic_matrix [Pandas Dataframe]: Dataframe containing topics scores of every document (columns=topics, rows=documents)
@@ -52,6 +65,8 @@ def nmf_topic_modeling (word_matrix, vocab, n = 5):
 
     nmf = NMF(n_components = n, max_iter = 1000)
     nmf.fit(word_matrix)
+    if output == 'arrays':
+        return nmf, nmf.reconstruction_err_, TopicMatrices.from_model(nmf, word_matrix, vocab, sparse_threshold)
 
     topic_matrix = pd.DataFrame(nmf.transform(word_matrix)).add_prefix("topic_")
     word_matrix = pd.DataFrame(nmf.components_, \
@@ -59,6 +74,232 @@ def nmf_topic_modeling (word_matrix, vocab, n = 5):
 
     return nmf, nmf.reconstruction_err_, topic_matrix, word_matrix
 
+def lda_partial_fit_topic_modeling(chunk_matrices, total_samples, n = 5, passes = 10, batch_size = 128, random_state = 0):
+    """
+        Fits online LDA chunk by chunk with partial_fit, for doc-word matrices that don't fit in memory.
+    Args:
+        chunk_matrices ([function]): Called once per pass, returns an iterable of doc-word matrices (one per chunk),
+            e.g. lambda: vectorizer.iter_transform(read_chunks()) with a fitted StreamingTfidfVectorizer
+        total_samples (int): Number of documents across all the chunks, e.g. StreamingTfidfVectorizer.n_documents_.
+            Online LDA scales every update by it, so it has to match the corpus size.
+        n (int, optional): Number of topics to be generated. Defaults to 5.
+        passes (int, optional): Number of passes over all the chunks. Defaults to 10.
+        batch_size (int, optional): Mini-batch size within every chunk. Defaults to 128.
+        random_state (int, optional): Seed of the LDA model. Defaults to 0.
+
+    Returns:
+        lda [Sklearn LDA Model]: The fitted LDA model; topic scores of documents can then be obtained chunk by chunk with transform
+    """
+
+    lda = LatentDirichletAllocation(n_components = n, learning_method = 'online', batch_size = batch_size,
+                                    total_samples = total_samples, random_state = random_state)
+    for _ in range(passes):
+        for matrix in chunk_matrices():
+            lda.partial_fit(matrix)
+
+    return lda
+
+class TopicMatrices:
+    """
+        Compact representation of a fitted topic model's output: float32 doc-topic & topic-word matrices
+        (dense NumPy arrays or CSR sparse matrices), with the vocabulary kept as a separate index.
+        The DataFrames returned by the topic modeling functions are available through doc_topic_df & word_topic_df;
+        for dense matrices these are views over the same arrays rather than copies.
+    Args:
+        doc_topic ([Numpy array or CSR matrix]): Topic scores of every document (rows=documents, columns=topics)
+        topic_word ([Numpy array or CSR matrix]): Topic scores of every word (rows=topics, columns=words)
+        vocab ([List/Array of strings]): Words making up the columns of topic_word
+    """
+
+    def __init__(self, doc_topic, topic_word, vocab):
+        self.doc_topic = doc_topic
+        self.topic_word = topic_word
+        self.vocab = np.asarray(vocab)
+
+    @classmethod
+    def from_model(cls, model, word_matrix, vocab, sparse_threshold = None):
+        """
+            Builds the matrices from a fitted sklearn topic model (LDA/NMF) & the doc-word matrix it was fitted on.
+        """
+
+        return cls(_compact_matrix(model.transform(word_matrix), sparse_threshold),
+                   _compact_matrix(model.components_, sparse_threshold), vocab)
+
+    @property
+    def topic_columns(self):
+        return [f'topic_{topic}' for topic in range(self.topic_word.shape[0])]
+
+    def doc_topic_df(self):
+        """
+            Same layout as the topic_matrix DataFrame of the topic modeling functions (columns=topics, rows=documents).
+        """
+
+        doc_topic = self.doc_topic.toarray() if ss.issparse(self.doc_topic) else self.doc_topic
+        return pd.DataFrame(doc_topic, columns = self.topic_columns, copy = False)
+
+    def word_topic_df(self):
+        """
+            Same layout as the word_matrix DataFrame of the topic modeling functions (columns=topics, rows=words).
+        """
+
+        topic_word = self.topic_word.toarray() if ss.issparse(self.topic_word) else self.topic_word
+        return pd.DataFrame(topic_word.T, index = self.vocab, columns = self.topic_columns, copy = False)
+
+    def top_words(self, topic = 0, n_words = 5):
+        """
+            Top scoring words under the topic, same output as top_words() on the word_topic_df.
+        Returns:
+            [Pandas Series]: Top scoring words (index) & their scores, in descending order of score
+        """
+
+        scores = _dense_row(self.topic_word, topic)
+        top = top_k_indices(scores, n_words)
+        return pd.Series(scores[top], index = self.vocab[top], name = f'topic_{topic}')
+
+    def top_documents(self, topic = 0, n_docs = 5):
+        """
+            Positions of the top scoring documents under the topic, in descending order of score.
+        Returns:
+            [Numpy array of int]: Row positions into the corpus the model was fitted on
+        """
+
+        return top_k_indices(_dense_column(self.doc_topic, topic), n_docs)
+
+def _compact_matrix(matrix, sparse_threshold = None):
+    """
+        Converts to float32 & optionally to CSR, dropping the scores below sparse_threshold.
+    """
+
+    matrix = np.asarray(matrix, dtype = np.float32)
+    if sparse_threshold is None:
+        return matrix
+    return ss.csr_matrix(np.where(matrix >= sparse_threshold, matrix, 0))
+
+def _dense_row(matrix, row):
+    """
+        Single row of a dense or sparse matrix as a 1D array.
+    """
+
+    if ss.issparse(matrix):
+        return matrix[row].toarray().ravel()
+    return matrix[row]
+
+def _dense_column(matrix, column):
+    """
+        Single column of a dense or sparse matrix as a 1D array.
+    """
+
+    if ss.issparse(matrix):
+        return matrix[:, column].toarray().ravel()
+    return matrix[:, column]
+
+def topic_count_sweep(word_matrix, n_components_range, method = 'lda', n_jobs = -1, max_iter = None, tol = None,
+                      warm_start = False, batch_size = 128, random_state = 0, return_models = False):
+    """
+        Fits a topic model for every topic count in the range, in parallel across cores, to help choose the number of topics.
+        LDA candidates use online (mini-batch) LDA, stopping early once the perplexity improves by less than 'tol'.
+        NMF candidates stop early once the reconstruction error improves by less than 'tol'. With warm_start, the
+        topic counts are split into one ascending chain per job, and each candidate is initialized from the previous
+        candidate of its chain (with the extra topics initialized randomly).
+    Args:
+        word_matrix ([Numpy/Sparse Matrix]): TF-IDF or Word Count Frequency Vector
+        n_components_range ([iterable of int]): Topic counts to be tried, e.g. range(5, 31, 5)
+        method (str, optional): 'lda' or 'nmf'. Defaults to 'lda'.
+        n_jobs (int, optional): Number of candidates fitted in parallel (-1 uses all the cores). Defaults to -1.
+        max_iter (int, optional): Maximum passes/iterations per candidate. Defaults to 100 for LDA & 1000 for NMF, same as the single fit functions.
+        tol (float, optional): Early stopping tolerance; perp_tol for LDA & tol for NMF. Defaults to sklearn's defaults (0.1 & 1e-4).
+        warm_start (bool, optional): Warm start NMF candidates from the previous topic count. Defaults to False, as warm
+            started candidates did not converge in fewer iterations than cold starts & the chains limit the parallelism.
+        batch_size (int, optional): Mini-batch size of online LDA. Defaults to 128.
+        random_state (int, optional): Seed used by every candidate. Defaults to 0.
+        return_models (bool, optional): If the fitted models should be returned as well. Defaults to False.
+
+    Returns:
+        results [Pandas Dataframe]: One row per topic count with the score (bound_ for LDA, reconstruction_err_ for NMF),
+                                    number of iterations run, wall time & peak memory (increase of the
+                                    worker's resident memory during the fit)
+        models [dict]: Only if return_models is set, fitted model keyed by topic count
+    """
+
+    if method not in ('lda', 'nmf'):
+        raise ValueError(f"method should be 'lda' or 'nmf', got {method!r}")
+
+    n_components_list = sorted(set(n_components_range))
+    n_chains = min(effective_n_jobs(n_jobs), len(n_components_list))
+
+    if method == 'nmf' and warm_start:
+        # Contiguous ascending chains, so every warm start adds only a few topics to the previous candidate
+        chains = [list(chain) for chain in np.array_split(n_components_list, n_chains) if len(chain)]
+    else:
+        chains = [[n] for n in n_components_list]
+
+    chain_results = Parallel(n_jobs = n_jobs)(
+        delayed(_fit_sweep_chain)(word_matrix, chain, method, max_iter, tol, batch_size, random_state)
+        for chain in chains)
+
+    candidates = [candidate for chain in chain_results for candidate in chain]
+    results = (pd.DataFrame([candidate['result'] for candidate in candidates])
+               .sort_values('n_components')
+               .set_index('n_components'))
+
+    if return_models:
+        return results, {candidate['result']['n_components']: candidate['model'] for candidate in candidates}
+    return results
+
+def _fit_sweep_chain(word_matrix, chain, method, max_iter, tol, batch_size, random_state):
+    """
+    Fits the topic counts of a chain one after the other, warm starting NMF from the previous fit of the chain.
+    """
+
+    candidates = []
+    previous = None
+    for n in chain:
+        # Resident memory is sampled from a thread, as tracing the allocations would slow the fit down several times
+        with PeakMemoryMonitor() as memory:
+            start = time.perf_counter()
+            model, score, previous = _fit_sweep_candidate(word_matrix, n, previous, method, max_iter, tol, batch_size, random_state)
+            wall_time = time.perf_counter() - start
+
+        candidates.append({'model': model,
+                           'result': {'n_components': n, 'score': score, 'n_iter': model.n_iter_, 'wall_time_sec': wall_time,
+                                      'peak_memory_mb': (memory.peak - memory.start_rss) / 2 ** 20}})
+    return candidates
+
+def _fit_sweep_candidate(word_matrix, n, previous, method, max_iter, tol, batch_size, random_state):
+    """
+    Fits a single candidate of the sweep & returns the model, its score & the NMF factors to warm start the next candidate.
+    """
+
+    if method == 'lda':
+        model = LatentDirichletAllocation(n_components = n, learning_method = 'online', batch_size = batch_size,
+                                          max_iter = max_iter or 100, evaluate_every = 1,
+                                          perp_tol = 0.1 if tol is None else tol, random_state = random_state, n_jobs = 1)
+        model.fit(word_matrix)
+        return model, model.bound_, None
+
+    model = NMF(n_components = n, max_iter = max_iter or 1000, tol = 1e-4 if tol is None else tol,
+                random_state = random_state)
+    if previous is None:
+        W = model.fit_transform(word_matrix)
+    else:
+        model.init = 'custom'
+        W_init, H_init = _extend_nmf_factors(word_matrix, previous[0], previous[1], n, random_state)
+        W = model.fit_transform(word_matrix, W = W_init, H = H_init)
+    return model, model.reconstruction_err_, (W, model.components_)
+
+def _extend_nmf_factors(word_matrix, W, H, n, random_state):
+    """
+    Pads fitted NMF factors with randomly initialized topics (scaled like sklearn's 'random' init) up to 'n' topics.
+    """
+
+    n_new = n - W.shape[1]
+    rng = np.random.RandomState(random_state)
+    avg = np.sqrt(word_matrix.mean() / n)
+    W_new = np.abs(avg * rng.randn(W.shape[0], n_new)).astype(W.dtype)
+    H_new = np.abs(avg * rng.randn(n_new, H.shape[1])).astype(H.dtype)
+
+    return np.hstack([W, W_new]), np.vstack([H, H_new])
+
 def top_reviews(topic_matrix_df, topic = 0, n_reviews = 5):
     """
         Function to return the top scoring documents under the provided topic #.
@@ -69,10 +310,11 @@ def top_reviews(topic_matrix_df, topic = 0, n_reviews = 5):
 
     Returns:
         [Numpy array of strings]: Top scoring documents (reviews) under the specified topic, arranged in descending order of score
+                                  (a stable sort, so tied documents keep their row order)
     """
 
     return (topic_matrix_df
-            .sort_values(by=f'topic_{topic}', ascending=False)
+            .sort_values(by=f'topic_{topic}', ascending=False, kind='mergesort')
             .head(n_reviews)['raw_review']
             .values)
 
@@ -86,8 +328,66 @@ def top_words(word_topic_matrix_df, topic = 0, n_words = 5):
 
     Returns:
         [Pandas Series]: Top scoring words under the specified topic, arranged in descending order of score
+                         (a stable sort, so tied words keep their row order)
     """
 
     return (word_topic_matrix_df
-            .sort_values(by=f'topic_{topic}', ascending=False)
-            .head(n_words))[f'topic_{topic}']
\ No newline at end of file
+            .sort_values(by=f'topic_{topic}', ascending=False, kind='mergesort')
+            .head(n_words))[f'topic_{topic}']
+
+def top_words_and_reviews(word_topic_matrix_df, topic_matrix_df = None, n_words = 5, n_reviews = 5):
+    """
+        Batch version of top_words & top_reviews, returning the top words and top reviews of every topic in one pass.
+        Uses np.argpartition over the underlying arrays instead of fully sorting the DataFrames once per topic.
+        Outputs match calling top_words & top_reviews for each topic, both of which sort stably (tied scores are ordered by row).
+    Args:
+        word_topic_matrix_df ([Pandas Dataframe]): Contains the vocabulary words as rows, topics as columns and topic scores as values.
+        topic_matrix_df ([Pandas Dataframe], optional): Contains the documents (reviews) as rows, topics as columns, topic scores as values
+            and the text of the review in a 'raw_review' column. Defaults to None i.e. top reviews are not computed.
+        n_words (int, optional): Number of words to be returned per topic. Defaults to 5.
+        n_reviews (int, optional): Number of documents (reviews) to be returned per topic. Defaults to 5.
+
+    Returns:
+        Returns a tuple containing 2 elements
+        words [dict]: Topic # -> [Pandas Series] of top scoring words, same as top_words
+        reviews [dict]: Topic # -> [Numpy array of strings] of top scoring reviews, same as top_reviews. Empty if topic_matrix_df is None
+    """
+
+    topic_columns = [column for column in word_topic_matrix_df.columns if column.startswith('topic_')]
+    topics = [int(column[len('topic_'):]) for column in topic_columns]
+
+    word_scores = word_topic_matrix_df[topic_columns].to_numpy().T
+    word_positions = _top_k_indices_per_row(word_scores, n_words)
+    words = {topic: word_topic_matrix_df[column].iloc[positions]
+             for topic, column, positions in zip(topics, topic_columns, word_positions)}
+
+    reviews = {}
+    if topic_matrix_df is not None:
+        review_scores = topic_matrix_df[topic_columns].to_numpy().T
+        raw_reviews = topic_matrix_df['raw_review'].values
+        review_positions = _top_k_indices_per_row(review_scores, n_reviews)
+        reviews = {topic: raw_reviews[positions] for topic, positions in zip(topics, review_positions)}
+
+    return words, reviews
+
+def _top_k_indices_per_row(scores, k):
+    """
+        Indices of the 'k' highest scores of every row (descending), with a single argpartition over the whole matrix.
+        NaN scores are ranked last. Rows with ties at the cut-off fall back to top_k_indices, so ties are ordered by index.
+    """
+
+    scores = np.where(np.isnan(scores), -np.inf, scores)
+    n = scores.shape[1]
+    k = min(k, n)
+    if k <= 0:
+        return np.zeros((scores.shape[0], 0), dtype = int)
+
+    top = np.argpartition(-scores, k - 1, axis = 1)[:, :k]
+    top_scores = np.take_along_axis(scores, top, axis = 1)
+    top = np.take_along_axis(top, np.lexsort((top, -top_scores), axis = -1), axis = 1)
+
+    n_candidates = (scores >= top_scores.min(axis = 1, keepdims = True)).sum(axis = 1)
+    for row in np.flatnonzero(n_candidates > k):
+        top[row] = top_k_indices(scores[row], k)
+
+    return top